@@ -0,0 +1,64 @@
+"""
+Compares two benchmark result files from suite.py, e.g. the base branch
+against a change, and fails when a scenario got slower than the threshold.
+
+    python benchmarks/compare.py baseline.json results.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {
+        (result["scenario"], result["resolution"]): result
+        for result in report["results"]
+        if "error" not in result
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative rate drop reported as a regression.",
+    )
+    args = parser.parse_args()
+
+    baseline_report, baseline = load_results(args.baseline)
+    current_report, current = load_results(args.current)
+    print(f"baseline {baseline_report.get('commit')}")
+    print(f"current  {current_report.get('commit')}")
+
+    regressions = []
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key], current[key]
+        change = after["rate"] / before["rate"] - 1
+        rss_change = after["peak_rss_mb"] - before["peak_rss_mb"]
+        flag = ""
+        if change < -args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(
+            f"{key[0]:>10} {key[1]:>8}: {before['rate']:8.2f} -> "
+            f"{after['rate']:8.2f}/s ({change:+7.1%}), "
+            f"RSS {rss_change:+6.0f} MB, "
+            f"subprocesses {before['subprocesses']} -> {after['subprocesses']}"
+            f"{flag}"
+        )
+
+    for key in sorted(baseline.keys() ^ current.keys()):
+        print(f"{key[0]:>10} {key[1]:>8}: only in one of the files")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Cold import time of the package and of the moviepy modules it used to load
+eagerly. Every statement runs in a fresh interpreter, best of `--repeat`.
+
+    python benchmarks/import_time.py --output import_time.json
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+STATEMENTS = [
+    "import video_editor",
+    "from video_editor import Animation",
+    "from video_editor import get_audio_clip",
+    "from video_editor import get_image_clips",
+    "from video_editor import write_video",
+    "from video_editor import run_batch",
+    "import moviepy.editor",
+]
+
+HEAVY_MODULES = [
+    "moviepy.editor",
+    "moviepy.video.VideoClip",
+    "moviepy.video.fx.resize",
+    "imageio",
+    "scipy",
+    "cv2",
+]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [m for m in {heavy_modules!r} if m in sys.modules]]))
+"""
+
+
+def time_import(statement, repeat):
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                SCRIPT.format(statement=statement, heavy_modules=HEAVY_MODULES),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        elapsed, loaded = json.loads(output)
+        times.append(elapsed)
+    return {"statement": statement, "time": min(times), "loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for statement in STATEMENTS:
+        result = time_import(statement, args.repeat)
+        results.append(result)
+        print(
+            f"{result['statement']:<42} {result['time'] * 1000:8.1f} ms  "
+            f"{', '.join(result['loaded']) or '-'}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
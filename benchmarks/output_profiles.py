@@ -0,0 +1,70 @@
+"""
+Encode time versus file size of the output presets on a reference
+timeline of zooming synthetic photos with a tone soundtrack.
+
+    python benchmarks/output_profiles.py --width 1080 --height 1920 --duration 10
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from moviepy.editor import AudioClip, ImageClip, concatenate_videoclips
+
+from video_editor import OutputPreset, get_output_profile, write_video
+from video_editor.video_animations import zoom_in, zoom_out
+
+
+def get_reference_timeline(width, height, duration, num_images=4):
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    clip_duration = duration / num_images
+
+    clips = []
+    for i in range(num_images):
+        image = np.stack(
+            [
+                127 + 127 * np.sin(x / (23 + 7 * i)),
+                127 + 127 * np.cos(y / (31 + 5 * i)),
+                255 * (x + y) / (width + height),
+            ],
+            axis=-1,
+        ).astype(np.uint8)
+        clip = ImageClip(image).set_duration(clip_duration)
+        zoom = zoom_in if i % 2 == 0 else zoom_out
+        clips.append(zoom(clip, duration=clip_duration, factor=1.2))
+
+    def make_tone(t):
+        tone = 0.2 * np.sin(2 * np.pi * 440 * np.asarray(t))
+        return np.stack([tone, tone], axis=-1)
+
+    audio = AudioClip(make_tone, duration=duration, fps=44100)
+    return concatenate_videoclips(clips).set_audio(audio)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=1080)
+    parser.add_argument("--height", type=int, default=1920)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    timeline = get_reference_timeline(args.width, args.height, args.duration)
+    profiles = {"default": get_output_profile()}
+    profiles.update(
+        {preset.value: get_output_profile(preset) for preset in OutputPreset}
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, profile in profiles.items():
+            output_path = os.path.join(tmp_dir, f"{name}.mp4")
+            start = time.perf_counter()
+            write_video(timeline, output_path, output_profile=profile)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(output_path) / 1024**2
+            print(f"{name:>8}: {elapsed:7.2f} s  {size:8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Per-frame latency of the resampling backends: the zoom animation, which
+resamples a window of a source with zoom headroom, and the downscaling of
+a decoded photo to the output size.
+
+    python benchmarks/resampling.py --frames 20 --output resampling.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from video_editor import Resampling, ResamplingBackend, get_resampler
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+def make_image(width, height):
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    return np.stack(
+        [
+            127 + 127 * np.sin(x / 41),
+            127 + 127 * np.cos(y / 29),
+            255 * (x + y) / (width + height),
+        ],
+        axis=-1,
+    ).astype(np.uint8)
+
+
+def measure(resample, frames):
+    resample(0)
+    start = time.perf_counter()
+    for i in range(frames):
+        resample(i)
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--headroom", type=float, default=1.4)
+    parser.add_argument(
+        "--resolutions", nargs="+", default=list(RESOLUTIONS), choices=RESOLUTIONS
+    )
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = []
+    for resolution in args.resolutions:
+        size = RESOLUTIONS[resolution]
+        source = make_image(
+            round(size[0] * args.headroom), round(size[1] * args.headroom)
+        )
+        photo = make_image(size[0] * 2, size[1] * 2)
+
+        for backend in ResamplingBackend:
+            for quality in Resampling:
+                try:
+                    resampler = get_resampler(backend, quality)
+                except ImportError as e:
+                    print(f"{resolution:>6} {backend.value:>7}: {e}")
+                    break
+
+                # Zoom magnifications sweep the range used by the animations.
+                zoom = measure(
+                    lambda i: resampler.zoom(
+                        source, size, 1 + (args.headroom**2 - 1) * i / args.frames
+                    ),
+                    args.frames,
+                )
+                downscale = measure(
+                    lambda i: resampler.resample(photo, size), args.frames
+                )
+                results.append(
+                    {
+                        "resolution": resolution,
+                        "backend": backend.value,
+                        "quality": quality.value,
+                        "zoom_ms": zoom * 1000,
+                        "downscale_ms": downscale * 1000,
+                    }
+                )
+                print(
+                    f"{resolution:>6} {backend.value:>7} {quality.value:>8}: "
+                    f"zoom {zoom * 1000:7.1f} ms, downscale {downscale * 1000:7.1f} ms"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+Reproducible benchmarks of the hot paths on synthetic inputs generated
+offline: images, a tone soundtrack, word-timed subtitles and the bundled
+Lato font. Each scenario runs in its own forked process, so peak RSS and
+the number of spawned subprocesses (ffmpeg, ImageMagick) are its own.
+The benchmarks need the "benchmarks" extra (pip install -e ".[benchmarks]").
+
+    python benchmarks/suite.py --output results.json --resolutions 720p 1080p
+    python benchmarks/compare.py baseline.json results.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+from scipy.io import wavfile
+
+FONT_PATH = os.path.join(os.path.dirname(__file__), "assets", "Lato-Regular.ttf")
+FPS = 30
+AUDIO_FPS = 44100
+
+RESOLUTIONS = {
+    "480p": (854, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "vertical": (1080, 1920),
+}
+
+
+def make_images(images_dir, num_images, size, seed=0):
+    rng = np.random.default_rng(seed)
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+
+    os.makedirs(images_dir, exist_ok=True)
+    for i in range(num_images):
+        # Smooth gradients plus noise, so decoders and encoders see
+        # photo-like content rather than flat colours.
+        base = np.stack(
+            [
+                127 + 127 * np.sin(x / (41 + 9 * i)),
+                127 + 127 * np.cos(y / (29 + 7 * i)),
+                255 * (x + y) / (width + height),
+            ],
+            axis=-1,
+        )
+        noise = rng.normal(0, 12, base.shape)
+        image = np.clip(base + noise, 0, 255).astype(np.uint8)
+        Image.fromarray(image).save(
+            os.path.join(images_dir, f"image_{i:03d}.jpg"), quality=90
+        )
+
+
+def make_tone(path, duration, frequency=440):
+    t = np.arange(int(duration * AUDIO_FPS)) / AUDIO_FPS
+    tone = 0.2 * np.sin(2 * np.pi * frequency * t)
+    samples = (np.stack([tone, tone], axis=-1) * 32767).astype(np.int16)
+    wavfile.write(path, AUDIO_FPS, samples)
+
+
+def make_subtitles(path, num_words, duration, words_per_line=4, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = [
+        "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog",
+        "video", "editor", "renders", "every", "frame", "with", "subtitles",
+    ]  # fmt: skip
+    word_duration = duration / num_words
+
+    subtitles = []
+    for first in range(0, num_words, words_per_line):
+        words = []
+        for i in range(first, min(first + words_per_line, num_words)):
+            words.append(
+                {
+                    "word": str(rng.choice(vocabulary)),
+                    "start": i * word_duration,
+                    "end": (i + 1) * word_duration,
+                }
+            )
+        subtitles.append({"words": words})
+
+    with open(path, "w") as f:
+        json.dump(subtitles, f)
+
+
+def make_inputs(work_dir, duration, num_images, num_words):
+    inputs = {
+        "images_dir": os.path.join(work_dir, "images"),
+        "audio_path": os.path.join(work_dir, "tone.wav"),
+        "subtitles_path": os.path.join(work_dir, "subtitles.json"),
+        "work_dir": work_dir,
+        "duration": duration,
+    }
+    make_images(inputs["images_dir"], num_images, size=(2400, 1800))
+    make_tone(inputs["audio_path"], duration=min(duration, 3))
+    make_subtitles(inputs["subtitles_path"], num_words, duration)
+    return inputs
+
+
+def get_slideshow(inputs, size, animate=False, flatten=False):
+    from video_editor import auto_animate_video_clips, get_image_clips
+
+    clips = get_image_clips(
+        inputs["images_dir"],
+        total_duration=inputs["duration"],
+        min_image_duration=inputs["duration"] / len(os.listdir(inputs["images_dir"])),
+        target_size=size,
+        zoom_headroom=1.4 if animate else 1,
+        lazy=True,
+    )
+    if animate:
+        clips, _ = auto_animate_video_clips(clips, seed=0, flatten=flatten)
+    else:
+        start = 0
+        for i, clip in enumerate(clips):
+            clips[i] = clip.set_start(start)
+            start += clip.duration
+    return clips
+
+
+def get_subtitles(inputs, size, layout=None):
+    from video_editor import SubtitleLayout, TextAnimation, get_subtitle_clips
+
+    with open(inputs["subtitles_path"]) as f:
+        subtitles = json.load(f)
+
+    return get_subtitle_clips(
+        subtitles,
+        screen_width=size[0],
+        font_path=FONT_PATH,
+        font_size=size[1] // 16,
+        animation=TextAnimation.SLIDE_UP_FADE_IN,
+        layout=layout or SubtitleLayout.WORDS,
+    )
+
+
+def render_frames(clip):
+    num_frames = int(clip.duration * FPS)
+    for i in range(num_frames):
+        clip.get_frame(i / FPS)
+    return num_frames
+
+
+def run_slideshow(inputs, size):
+    from video_editor import merge_video_clips
+
+    return render_frames(merge_video_clips(get_slideshow(inputs, size)))
+
+
+def run_zoom(inputs, size):
+    from video_editor import merge_video_clips
+
+    clips = get_slideshow(inputs, size, animate=True)
+    return render_frames(merge_video_clips(clips))
+
+
+def run_zoom_flat(inputs, size):
+    from video_editor import merge_video_clips
+
+    clips = get_slideshow(inputs, size, animate=True, flatten=True)
+    return render_frames(merge_video_clips(clips))
+
+
+def run_subtitles(inputs, size):
+    from moviepy.video.VideoClip import ColorClip
+    from video_editor import merge_video_clips
+
+    background = ColorClip(size, color=(0, 0, 0), duration=inputs["duration"])
+    subtitle_clips = get_subtitles(inputs, size)
+    return render_frames(merge_video_clips([background], subtitle_clips=subtitle_clips))
+
+
+def run_subtitle_lines(inputs, size):
+    from moviepy.video.VideoClip import ColorClip
+    from video_editor import SubtitleLayout, merge_video_clips
+
+    background = ColorClip(size, color=(0, 0, 0), duration=inputs["duration"])
+    subtitle_clips = get_subtitles(inputs, size, layout=SubtitleLayout.LINES)
+    return render_frames(merge_video_clips([background], subtitle_clips=subtitle_clips))
+
+
+def run_audio_mix(inputs, size):
+    from video_editor import get_audio_clip, merge_audio_clips
+
+    duration = inputs["duration"]
+    clips = [
+        get_audio_clip(inputs["audio_path"], duration=duration, volume=0.5),
+        get_audio_clip(inputs["audio_path"], duration=duration / 2, offset_time=1),
+        get_audio_clip(inputs["audio_path"], duration=duration / 4, offset_time=2),
+    ]
+    mix = merge_audio_clips(clips)
+    for _ in mix.iter_chunks(chunksize=AUDIO_FPS, fps=AUDIO_FPS):
+        pass
+    # Seconds of mixed audio, so the rate reads as "x real time".
+    return duration
+
+
+def run_write(inputs, size):
+    from video_editor import get_audio_clip, merge_video_clips, write_video
+
+    clips = get_slideshow(inputs, size, animate=True)
+    final_clip = merge_video_clips(clips, subtitle_clips=get_subtitles(inputs, size))
+    final_clip = final_clip.set_audio(
+        get_audio_clip(inputs["audio_path"], duration=final_clip.duration)
+    )
+    write_video(final_clip, os.path.join(inputs["work_dir"], "write.mp4"))
+    return int(final_clip.duration * FPS)
+
+
+def write_slideshow(inputs, size, ffmpeg_slideshows):
+    from video_editor import get_audio_clip, merge_video_clips, write_video
+
+    final_clip = merge_video_clips(get_slideshow(inputs, size))
+    final_clip = final_clip.set_audio(
+        get_audio_clip(inputs["audio_path"], duration=final_clip.duration)
+    )
+    write_video(
+        final_clip,
+        os.path.join(inputs["work_dir"], "slideshow.mp4"),
+        ffmpeg_slideshows=ffmpeg_slideshows,
+    )
+    return int(final_clip.duration * FPS)
+
+
+def run_write_audio(inputs, size):
+    from video_editor import (
+        get_audio_clip,
+        merge_audio_clips,
+        merge_video_clips,
+        write_video,
+    )
+
+    duration = inputs["duration"]
+    final_clip = merge_video_clips(get_slideshow(inputs, size))
+    audio_clip = merge_audio_clips(
+        [get_audio_clip(inputs["audio_path"], offset_time=1)],
+        bg_audio_clip=get_audio_clip(
+            inputs["audio_path"], duration=duration, volume=0.5
+        ),
+    )
+    write_video(
+        final_clip.set_audio(audio_clip),
+        os.path.join(inputs["work_dir"], "audio.mp4"),
+        ffmpeg_slideshows=False,
+    )
+    return int(final_clip.duration * FPS)
+
+
+def write_subtitles(inputs, size, burn_in):
+    from video_editor import (
+        BurnIn,
+        TextAnimation,
+        get_ass_subtitles,
+        get_audio_clip,
+        merge_video_clips,
+        write_video,
+    )
+
+    if burn_in:
+        with open(inputs["subtitles_path"]) as f:
+            subtitles = json.load(f)
+        burn_in = BurnIn(
+            subtitles=get_ass_subtitles(
+                subtitles,
+                screen_size=size,
+                font_path=FONT_PATH,
+                font_size=size[1] // 16,
+                animation=TextAnimation.SLIDE_UP_FADE_IN,
+            )
+        )
+        final_clip = merge_video_clips(get_slideshow(inputs, size))
+    else:
+        burn_in = None
+        final_clip = merge_video_clips(
+            get_slideshow(inputs, size), subtitle_clips=get_subtitles(inputs, size)
+        )
+    final_clip = final_clip.set_audio(
+        get_audio_clip(inputs["audio_path"], duration=final_clip.duration)
+    )
+    write_video(
+        final_clip,
+        os.path.join(inputs["work_dir"], "subtitles.mp4"),
+        burn_in=burn_in,
+    )
+    return int(final_clip.duration * FPS)
+
+
+def run_write_subtitles(inputs, size):
+    return write_subtitles(inputs, size, burn_in=False)
+
+
+def run_write_subtitles_burn_in(inputs, size):
+    return write_subtitles(inputs, size, burn_in=True)
+
+
+def run_write_slideshow(inputs, size):
+    return write_slideshow(inputs, size, ffmpeg_slideshows=True)
+
+
+def run_write_slideshow_frames(inputs, size):
+    return write_slideshow(inputs, size, ffmpeg_slideshows=False)
+
+
+SCENARIOS = {
+    "slideshow": run_slideshow,
+    "zoom": run_zoom,
+    "zoom_flat": run_zoom_flat,
+    "subtitles": run_subtitles,
+    "subtitle_lines": run_subtitle_lines,
+    "audio_mix": run_audio_mix,
+    "write": run_write,
+    "write_slideshow": run_write_slideshow,
+    "write_slideshow_frames": run_write_slideshow_frames,
+    "write_audio": run_write_audio,
+    "write_subtitles": run_write_subtitles,
+    "write_subtitles_burn_in": run_write_subtitles_burn_in,
+}
+
+
+def count_subprocesses():
+    counter = {"subprocesses": 0}
+    popen_init = subprocess.Popen.__init__
+
+    def counting_init(self, *args, **kwargs):
+        counter["subprocesses"] += 1
+        popen_init(self, *args, **kwargs)
+
+    subprocess.Popen.__init__ = counting_init
+    return counter
+
+
+def run_scenario(name, inputs, size, connection):
+    try:
+        counter = count_subprocesses()
+        start = time.perf_counter()
+        units = SCENARIOS[name](inputs, size)
+        wall_time = time.perf_counter() - start
+        connection.send(
+            {
+                "units": units,
+                "wall_time": wall_time,
+                "rate": units / wall_time,
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                / 1024,
+                "subprocesses": counter["subprocesses"],
+            }
+        )
+    except BaseException as e:
+        connection.send({"error": f"{type(e).__name__}: {e}"})
+        raise
+    finally:
+        connection.close()
+
+
+def run_isolated(name, inputs, size):
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_scenario, args=(name, inputs, size, sender))
+    process.start()
+    sender.close()
+    result = receiver.recv()
+    process.join()
+    return result
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS)
+    )
+    parser.add_argument(
+        "--resolutions",
+        nargs="+",
+        default=["480p", "720p", "1080p"],
+        choices=list(RESOLUTIONS),
+    )
+    parser.add_argument("--duration", type=float, default=6)
+    parser.add_argument("--images", type=int, default=6)
+    parser.add_argument("--words", type=int, default=60)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        inputs = make_inputs(work_dir, args.duration, args.images, args.words)
+
+        for resolution in args.resolutions:
+            for name in args.scenarios:
+                result = run_isolated(name, inputs, RESOLUTIONS[resolution])
+                result.update(scenario=name, resolution=resolution)
+                results.append(result)
+
+                if "error" in result:
+                    print(f"{name:>10} {resolution:>8}: {result['error']}")
+                    continue
+                print(
+                    f"{name:>10} {resolution:>8}: {result['rate']:8.2f}/s "
+                    f"{result['wall_time']:7.2f} s {result['peak_rss_mb']:7.0f} MB "
+                    f"{result['subprocesses']:3d} subprocesses"
+                )
+
+    report = {
+        "commit": get_commit(),
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
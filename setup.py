@@ -7,8 +7,16 @@ setup(
     package_dir={"": "src"},
     install_requires=[
         "moviepy",
-        "scipy",
+        "numpy",
+        "pillow",
     ],
+    extras_require={
+        # Only the benchmarks use scipy, as a reference and to write audio.
+        "benchmarks": ["scipy"],
+    },
+    entry_points={
+        "console_scripts": ["video-editor-batch=video_editor.batch:main"],
+    },
     author="Aviv Illoz",
     author_email="avivilloz@gmail.com",
     description=(
@@ -1,9 +1,105 @@
-import moviepy.config as cfg
+import importlib
 
-cfg.change_settings({"IMAGEMAGICK_BINARY": "magick"})
-
-from .image_clips import *
-from .video_clips import *
-from .audio_clips import *
-from .text_clips import *
+from . import enums as _enums
 from .enums import *
+
+# Submodules are imported on first access to one of their names, so that
+# importing the package (e.g. in a worker process only mixing audio) doesn't
+# load moviepy, imageio and scipy up front.
+_lazy_names = {
+    "image_clips": ["get_image_clip", "get_image_clips", "get_watermark_clip"],
+    "lazy_image_clips": ["DecodedImageCache", "LazyImageClip"],
+    "video_clips": [
+        "auto_animate_video_clips",
+        "merge_video_clips",
+        "extract_video_and_audio_clips",
+        "write_video",
+    ],
+    "audio_clips": [
+        "DecodedAudioCache",
+        "get_audio_clip",
+        "get_default_audio_cache",
+        "merge_audio_clips",
+        "set_audio_source",
+    ],
+    "text_clips": ["get_subtitle_clips"],
+    "compositing": ["Compositor", "get_compositor"],
+    "text_cache": ["WordRasterCache", "get_default_word_cache"],
+    "text_renderers": [
+        "TextRenderer",
+        "ImageMagickTextRenderer",
+        "PillowTextRenderer",
+        "get_text_renderer",
+    ],
+    "subtitle_track": ["SubtitleTrack"],
+    "burn_in": [
+        "AssSubtitles",
+        "BurnIn",
+        "WatermarkOverlay",
+        "get_ass_subtitles",
+        "get_watermark_overlay",
+    ],
+    "output_profiles": ["OutputProfile", "get_output_profile"],
+    "static_frames": [
+        "StaticAwareCompositeVideoClip",
+        "is_static",
+        "mark_static",
+        "set_frame_key_func",
+    ],
+    "render_plan": [
+        "AnimationPlan",
+        "ClipPlan",
+        "LayerPlan",
+        "SegmentPlan",
+        "RenderPlan",
+        "RenderPlanClip",
+        "compile_render_plan",
+    ],
+    "content_hashes": ["get_content_hash", "set_content_hash"],
+    "frame_extraction": [
+        "FrameExtractionError",
+        "get_first_frame",
+        "get_last_frame",
+        "set_frame_reader",
+    ],
+    "render_cache": ["RenderCache", "CachedVideoClip"],
+    "slideshows": ["Slideshow", "get_slideshow", "write_slideshow"],
+    "resampling": [
+        "Resampler",
+        "OpenCVResampler",
+        "PillowResampler",
+        "NumpyResampler",
+        "get_resampler",
+    ],
+    "batch": ["BatchJob", "JobResult", "load_manifest", "run_batch"],
+    "instrumentation": [
+        "Instrumentation",
+        "JsonSink",
+        "LoggingSink",
+        "disable_instrumentation",
+        "enable_instrumentation",
+        "get_instrumentation",
+        "instrumented",
+    ],
+}
+
+_lazy_modules = {
+    name: module for module, names in _lazy_names.items() for name in names
+}
+
+__all__ = [name for name in vars(_enums) if not name.startswith("_")]
+__all__ += list(_lazy_modules)
+
+
+def __getattr__(name):
+    module = _lazy_modules.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_modules))
@@ -1,19 +1,192 @@
-from moviepy.editor import AudioFileClip, CompositeAudioClip, concatenate_audioclips
+import threading
+from collections import OrderedDict
+import numpy as np
+from moviepy.audio.AudioClip import AudioArrayClip
+from moviepy.audio.io.AudioFileClip import AudioFileClip
 
-__all__ = ["get_audio_clip", "merge_audio_clips"]
+from .instrumentation import count, timer
 
+__all__ = [
+    "DecodedAudioCache",
+    "get_audio_clip",
+    "get_default_audio_cache",
+    "merge_audio_clips",
+    "set_audio_source",
+]
 
-def get_audio_clip(audio_path, duration=None, volume=1, offset_time=0):
-    audio = AudioFileClip(audio_path)
-    audio = audio.volumex(volume)
+AUDIO_FPS = 44100
+
+
+def to_stereo(samples: np.ndarray) -> np.ndarray:
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    if samples.shape[1] == 1:
+        samples = np.repeat(samples, 2, axis=1)
+    return samples
+
+
+def read_samples(clip, fps: int, chunk_size: int = 50000) -> np.ndarray:
+    chunks = list(clip.iter_chunks(chunksize=chunk_size, fps=fps))
+    return to_stereo(np.vstack(chunks)).astype(np.float32)
+
+
+def decode_audio(audio_path: str, fps: int) -> np.ndarray:
+    audio = AudioFileClip(audio_path, fps=fps)
+    try:
+        with timer("audio.decode"):
+            samples = read_samples(audio, fps)
+    finally:
+        audio.close()
+    samples.setflags(write=False)
+    return samples
+
+
+class DecodedAudioCache:
+    """
+    LRU cache of decoded audio files, holding their samples within a memory
+    budget. Clips keep the samples they play after they are evicted.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, audio_path: str, fps: int) -> np.ndarray:
+        key = (audio_path, fps)
+        with self._lock:
+            samples = self._entries.get(key)
+            if samples is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count("cache.audio.hits")
+                return samples
+
+        self.misses += 1
+        count("cache.audio.misses")
+        samples = decode_audio(audio_path, fps)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = samples
+                self.num_bytes += samples.nbytes
+
+            while self.num_bytes > self.max_bytes and len(self._entries) > 1:
+                _, old_samples = self._entries.popitem(last=False)
+                self.num_bytes -= old_samples.nbytes
+        return samples
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.num_bytes = 0
+
+
+_default_audio_cache = None
+
+
+def get_default_audio_cache() -> DecodedAudioCache:
+    global _default_audio_cache
+    if _default_audio_cache is None:
+        _default_audio_cache = DecodedAudioCache()
+    return _default_audio_cache
+
+
+def get_samples_clip(samples: np.ndarray, fps: int) -> AudioArrayClip:
+    clip = AudioArrayClip(samples, fps=fps)
+    # Tied to the frame function, so derived clips (volumex, subclip, ...)
+    # are read back through moviepy instead.
+    clip.samples = (clip.make_frame, samples)
+    return clip
+
+
+def get_audio_samples(clip, fps: int) -> np.ndarray:
+    samples = getattr(clip, "samples", None)
+    if samples and samples[0] is clip.make_frame and clip.fps == fps:
+        return samples[1]
+    return read_samples(clip, fps)
+
+
+def iter_audio_samples(clip, fps: int, chunk_size: int = 50000):
+    """
+    float32 stereo samples of the clip from its start to its end, in
+    chunks. Sample buffers are sliced rather than read back through moviepy.
+    """
+    num_samples = int(fps * clip.duration)
+    samples = getattr(clip, "samples", None)
+    if samples and samples[0] is clip.make_frame and clip.fps == fps:
+        buffer = samples[1][:num_samples]
+        for first in range(0, len(buffer), chunk_size):
+            yield buffer[first : first + chunk_size]
+        return
+
+    for chunk in clip.iter_chunks(chunksize=chunk_size, fps=fps):
+        yield to_stereo(chunk).astype(np.float32)
+
+
+def set_audio_source(clip, audio_path: str):
+    """
+    Records that the clip plays the encoded audio of `audio_path`
+    unchanged, so writers can copy the stream instead of encoding it again.
+    Tied to the frame function and duration, so derived clips (volumex,
+    subclip, ...) are encoded from their samples instead.
+    """
+    clip.audio_source = (clip.make_frame, clip.duration, audio_path)
+    return clip
+
+
+def get_audio_source(clip) -> str:
+    source = getattr(clip, "audio_source", None)
+    if source and source[0] is clip.make_frame and source[1] == clip.duration:
+        return source[2]
+    return None
+
+
+def get_audio_clip(
+    audio_path,
+    duration=None,
+    volume=1,
+    offset_time=0,
+    fps=AUDIO_FPS,
+    audio_cache: DecodedAudioCache = None,
+):
+    """
+    Decoded files are kept in `audio_cache`, by default one shared by the
+    process.
+    """
+    if audio_cache is None:
+        audio_cache = get_default_audio_cache()
+    samples = audio_cache.get(audio_path, fps)
     if duration:
-        num_loops = int(duration / audio.duration) + 1
-        audio = concatenate_audioclips([audio] * num_loops)
-        audio = audio.subclip(0, duration)
-    return audio.set_start(offset_time)
+        num_samples = int(round(duration * fps))
+        samples = samples[np.arange(num_samples) % len(samples)]
+    if volume != 1:
+        samples = samples * np.float32(volume)
 
+    clip = get_samples_clip(samples, fps)
+    if not duration and volume == 1:
+        set_audio_source(clip, audio_path)
+    return clip.set_start(offset_time)
 
-def merge_audio_clips(clips, bg_audio_clip=None):
+
+def merge_audio_clips(clips, bg_audio_clip=None, fps=AUDIO_FPS):
+    """
+    Mixes the clips into a single sample buffer, so writing the result
+    doesn't evaluate every source chunk by chunk.
+    """
     if bg_audio_clip:
         clips = [bg_audio_clip.set_start(0), *clips]
-    return CompositeAudioClip(clips)
+
+    num_samples = int(round(max(clip.end for clip in clips) * fps))
+    mix = np.zeros((num_samples, 2), dtype=np.float32)
+
+    with timer("audio.mix"):
+        for clip in clips:
+            samples = get_audio_samples(clip, fps)
+            first = int(round(clip.start * fps))
+            num_copied = max(0, min(len(samples), num_samples - first))
+            mix[first : first + num_copied] += samples[:num_copied]
+
+    return get_samples_clip(mix, fps)
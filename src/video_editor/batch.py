@@ -0,0 +1,434 @@
+"""
+Renders many videos from a JSON manifest of jobs:
+
+    python -m video_editor.batch manifest.json --workers 4 --cache-dir cache
+
+The manifest is a list of jobs, or an object with a "jobs" list and
+default runner options ("workers", "threads_per_job", "cache_dir",
+"state_path"). Each job is a BatchJob, e.g.
+
+    {"name": "intro", "images_dir": "images/intro", "audio_path": "intro.mp3",
+     "subtitles_path": "intro.json", "output_path": "out/intro.mp4",
+     "subtitle_options": {"font_path": "Lato.ttf", "font_size": 70}}
+"""
+
+import os
+import json
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+from .audio_clips import DecodedAudioCache, get_audio_clip
+from .burn_in import BurnIn, get_ass_subtitles, get_watermark_overlay
+from .content_hashes import hash_values
+from .enums import FitMode, OutputPreset, SubtitleLayout, TextAnimation, TextBackend
+from .image_clips import get_image_clips, get_watermark_clip
+from .lazy_image_clips import DecodedImageCache
+from .output_profiles import get_output_profile
+from .render_cache import RenderCache
+from .text_cache import WordRasterCache
+from .text_clips import get_subtitle_clips
+from .text_renderers import get_text_renderer
+from .video_clips import auto_animate_video_clips, merge_video_clips, write_video
+from .video_writers import can_fork, num_cores
+
+__all__ = ["BatchJob", "JobResult", "load_manifest", "run_batch"]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchJob:
+    """
+    One video: images from `images_dir`, shown for `duration` seconds or
+    for the length of the audio, with optional subtitles and watermark.
+    `subtitle_options` are passed to get_subtitle_clips, `output_settings`
+    override the `output_preset` profile. With `burn_in`, the subtitles and
+    watermark are drawn by ffmpeg while encoding.
+    """
+
+    name: str
+    images_dir: str
+    output_path: str
+    audio_path: str = None
+    audio_volume: float = 1
+    duration: float = None
+    max_duration: float = None
+    min_image_duration: float = 3
+    size: Tuple[int, int] = None
+    fit_mode: str = FitMode.COVER.value
+    animate: bool = True
+    flatten: bool = True
+    seed: int = None
+    zoom_factor: float = 1.4
+    subtitles_path: str = None
+    subtitle_options: dict = field(default_factory=dict)
+    text_backend: str = None
+    watermark_path: str = None
+    burn_in: bool = False
+    output_preset: str = None
+    output_settings: dict = field(default_factory=dict)
+    frame_workers: int = None
+
+    def fingerprint(self) -> str:
+        return hash_values(json.dumps(asdict(self), sort_keys=True))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BatchJob":
+        job = cls(**data)
+        if job.size is not None:
+            job.size = tuple(job.size)
+        return job
+
+
+@dataclass
+class JobResult:
+    name: str
+    output_path: str
+    status: str
+    wall_time: float = 0
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: str = None
+    fingerprint: str = None
+
+
+@dataclass
+class SharedCaches:
+    image_dir: str = None
+    image_cache: DecodedImageCache = None
+    word_cache: WordRasterCache = None
+    audio_cache: DecodedAudioCache = None
+    render_cache: RenderCache = None
+
+
+@lru_cache(maxsize=None)
+def get_shared_caches(cache_dir: str = None) -> SharedCaches:
+    # One set per worker process, reused by every job it runs. Fonts are
+    # cached by the text renderers themselves.
+    if cache_dir is None:
+        return SharedCaches(
+            image_cache=DecodedImageCache(),
+            word_cache=WordRasterCache(),
+            audio_cache=DecodedAudioCache(),
+        )
+
+    return SharedCaches(
+        image_dir=os.path.join(cache_dir, "images"),
+        image_cache=DecodedImageCache(),
+        word_cache=WordRasterCache(cache_dir=os.path.join(cache_dir, "words")),
+        audio_cache=DecodedAudioCache(),
+        render_cache=RenderCache(os.path.join(cache_dir, "renders")),
+    )
+
+
+def load_manifest(path: str) -> Tuple[List[BatchJob], dict]:
+    with open(path) as f:
+        manifest = json.load(f)
+
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+
+    jobs = [BatchJob.from_dict(job) for job in manifest.pop("jobs")]
+    return jobs, manifest
+
+
+def load_state(state_path: str) -> dict:
+    if not state_path or not os.path.exists(state_path):
+        return {}
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def save_state(state_path: str, state: dict):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def is_done(job: BatchJob, state: dict) -> bool:
+    job_state = state.get(job.name)
+    return (
+        job_state is not None
+        and job_state["status"] == "done"
+        and job_state["fingerprint"] == job.fingerprint()
+        and os.path.exists(job.output_path)
+    )
+
+
+def load_subtitles(path: str) -> list:
+    with open(path) as f:
+        subtitles = json.load(f)
+    if isinstance(subtitles, dict):
+        subtitles = subtitles["subtitles"]
+    return subtitles
+
+
+def get_subtitle_options(options: dict) -> dict:
+    options = dict(options)
+    if isinstance(options.get("animation"), str):
+        options["animation"] = TextAnimation[options["animation"].upper()]
+    if isinstance(options.get("layout"), str):
+        options["layout"] = SubtitleLayout(options["layout"])
+    return options
+
+
+def render_job(job: BatchJob, threads: int, cache_dir: str = None) -> dict:
+    caches = get_shared_caches(cache_dir)
+    timings = {}
+
+    @contextmanager
+    def stage(name):
+        start = perf_counter()
+        yield
+        timings[name] = perf_counter() - start
+
+    audio_clip = None
+    with stage("audio"):
+        if job.audio_path:
+            audio_clip = get_audio_clip(
+                job.audio_path,
+                volume=job.audio_volume,
+                audio_cache=caches.audio_cache,
+            )
+
+    duration = job.duration or (audio_clip.duration if audio_clip else None)
+    if not duration:
+        raise ValueError(f"Job {job.name} needs a duration or an audio file.")
+
+    with stage("images"):
+        clips = get_image_clips(
+            images_dir=job.images_dir,
+            total_duration=duration,
+            min_image_duration=job.min_image_duration,
+            target_size=job.size,
+            fit_mode=FitMode(job.fit_mode),
+            zoom_headroom=job.zoom_factor if job.animate else 1,
+            cache_dir=caches.image_dir,
+            lazy=True,
+            image_cache=caches.image_cache,
+        )
+        if not clips:
+            raise ValueError(f"No images found in {job.images_dir}.")
+
+    with stage("animate"):
+        if job.animate:
+            clips, _ = auto_animate_video_clips(
+                clips,
+                zoom_factor=job.zoom_factor,
+                flatten=job.flatten,
+                seed=job.seed,
+                render_cache=caches.render_cache,
+            )
+        else:
+            start = 0
+            for i, clip in enumerate(clips):
+                clips[i] = clip.set_start(start)
+                start += clip.duration
+
+    subtitle_clips = None
+    burn_in = BurnIn() if job.burn_in else None
+    with stage("subtitles"):
+        if job.subtitles_path and burn_in is not None:
+            burn_in.subtitles = get_ass_subtitles(
+                subtitles=load_subtitles(job.subtitles_path),
+                screen_size=clips[0].size,
+                **get_subtitle_options(job.subtitle_options),
+            )
+        elif job.subtitles_path:
+            text_backend = TextBackend(job.text_backend) if job.text_backend else None
+            subtitle_clips = get_subtitle_clips(
+                subtitles=load_subtitles(job.subtitles_path),
+                screen_width=clips[0].w,
+                word_cache=caches.word_cache,
+                text_renderer=get_text_renderer(text_backend),
+                **get_subtitle_options(job.subtitle_options),
+            )
+
+    watermark_clip = None
+    if job.watermark_path and burn_in is not None:
+        burn_in.watermark = get_watermark_overlay(
+            job.watermark_path, screen_size=clips[0].size
+        )
+    elif job.watermark_path:
+        watermark_clip = get_watermark_clip(job.watermark_path, duration=duration)
+
+    final_clip = merge_video_clips(
+        clips, watermark_clip=watermark_clip, subtitle_clips=subtitle_clips
+    )
+    if audio_clip is not None:
+        final_clip = final_clip.set_audio(audio_clip)
+
+    output_preset = OutputPreset(job.output_preset) if job.output_preset else None
+    profile = get_output_profile(output_preset, **job.output_settings).replace(
+        threads=threads
+    )
+
+    output_dir = os.path.dirname(os.path.abspath(job.output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    with stage("write"):
+        write_video(
+            final_clip,
+            job.output_path,
+            max_duration=job.max_duration,
+            output_profile=profile,
+            frame_workers=job.frame_workers,
+            burn_in=burn_in,
+        )
+
+    return timings
+
+
+def run_job(job: BatchJob, threads: int, cache_dir: str = None) -> JobResult:
+    start = perf_counter()
+    result = JobResult(
+        name=job.name,
+        output_path=job.output_path,
+        status="done",
+        fingerprint=job.fingerprint(),
+    )
+    try:
+        result.timings = render_job(job, threads=threads, cache_dir=cache_dir)
+    except Exception as e:
+        logger.exception("Job %s failed", job.name)
+        result.status = "failed"
+        result.error = f"{type(e).__name__}: {e}"
+    result.wall_time = perf_counter() - start
+    return result
+
+
+def run_batch(
+    jobs: List[BatchJob],
+    workers: int = None,
+    threads_per_job: int = None,
+    cache_dir: str = None,
+    state_path: str = None,
+) -> List[JobResult]:
+    """
+    Renders the jobs in a pool of `workers` processes. Each job encodes
+    with `threads_per_job` threads, by default an equal share of the
+    cores, so concurrent encoders don't oversubscribe the CPU. Workers
+    share the caches under `cache_dir`. With `state_path`, finished jobs
+    are recorded and skipped when the batch is run again, unless the job
+    changed or its output is missing.
+    """
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Batch job names must be unique.")
+
+    state = load_state(state_path)
+    pending_jobs = [job for job in jobs if not is_done(job, state)]
+    results = {
+        job.name: JobResult(
+            name=job.name,
+            output_path=job.output_path,
+            status="skipped",
+            fingerprint=job.fingerprint(),
+        )
+        for job in jobs
+        if is_done(job, state)
+    }
+
+    workers = max(1, min(workers or num_cores, len(pending_jobs) or 1))
+    threads = threads_per_job or max(1, num_cores // workers)
+
+    def record(result: JobResult):
+        results[result.name] = result
+        logger.info(
+            "Job %s %s in %.1fs %s",
+            result.name,
+            result.status,
+            result.wall_time,
+            result.timings,
+        )
+        if state_path:
+            state[result.name] = asdict(result)
+            save_state(state_path, state)
+
+    if workers == 1:
+        for job in pending_jobs:
+            record(run_job(job, threads=threads, cache_dir=cache_dir))
+    else:
+        context = multiprocessing.get_context("fork" if can_fork() else "spawn")
+        queued_jobs = deque(pending_jobs)
+        while queued_jobs:
+            # At most one job per worker is submitted, so when a worker dies,
+            # e.g. killed for running out of memory, the jobs in flight are
+            # known. They are failed and the others run in a new pool.
+            broken = False
+            running = {}
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                while running or (queued_jobs and not broken):
+                    while queued_jobs and not broken and len(running) < workers:
+                        job = queued_jobs.popleft()
+                        future = pool.submit(
+                            run_job, job, threads=threads, cache_dir=cache_dir
+                        )
+                        running[future] = job
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = running.pop(future)
+                        try:
+                            record(future.result())
+                        except BrokenProcessPool as e:
+                            logger.error("Job %s failed: %s", job.name, e)
+                            broken = True
+                            record(
+                                JobResult(
+                                    name=job.name,
+                                    output_path=job.output_path,
+                                    status="failed",
+                                    error=f"{type(e).__name__}: {e}",
+                                    fingerprint=job.fingerprint(),
+                                )
+                            )
+
+    return [results[name] for name in names]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m video_editor.batch",
+        description="Render the videos of a JSON manifest.",
+    )
+    parser.add_argument("manifest")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--threads-per-job", type=int)
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--state-path")
+    parser.add_argument("--report", help="Write the job results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    jobs, options = load_manifest(args.manifest)
+    results = run_batch(
+        jobs,
+        workers=args.workers or options.get("workers"),
+        threads_per_job=args.threads_per_job or options.get("threads_per_job"),
+        cache_dir=args.cache_dir or options.get("cache_dir"),
+        state_path=args.state_path or options.get("state_path"),
+    )
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=2)
+
+    failed = [result.name for result in results if result.status == "failed"]
+    if failed:
+        logger.error("Failed jobs: %s", ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
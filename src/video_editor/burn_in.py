@@ -0,0 +1,419 @@
+import os
+import math
+import struct
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple
+from PIL import Image, ImageColor, ImageFont
+
+from .enums import SubtitleLayout, TextAnimation
+from .text_clips import format_word
+
+__all__ = [
+    "AssSubtitles",
+    "BurnIn",
+    "WatermarkOverlay",
+    "get_ass_subtitles",
+    "get_watermark_overlay",
+]
+
+
+def escape_filter_value(value) -> str:
+    # Escaped once for the filter's option parser, then once more for the
+    # filtergraph parser.
+    value = str(value)
+    for char in "\\':":
+        value = value.replace(char, f"\\{char}")
+    for char in "\\'[],;":
+        value = value.replace(char, f"\\{char}")
+    return value
+
+
+def get_ass_color(color: str) -> str:
+    r, g, b = ImageColor.getrgb(color)[:3]
+    return f"&H00{b:02X}{g:02X}{r:02X}"
+
+
+def format_ass_time(t: float) -> str:
+    centiseconds = max(0, math.floor(t * 100 + 1e-6))
+    seconds, centiseconds = divmod(centiseconds, 100)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
+
+
+def escape_ass_text(text: str) -> str:
+    # ASS has no escape for override braces and backslashes.
+    return text.replace("\\", "/").replace("{", "(").replace("}", ")")
+
+
+@lru_cache(maxsize=32)
+def get_font(font_path: str, font_size: int):
+    return ImageFont.truetype(font_path, font_size)
+
+
+@lru_cache(maxsize=32)
+def get_line_height(font_path: str) -> float:
+    """
+    Height of a line in ems, as libass sizes fonts: the OS/2 table's
+    Windows ascent plus descent, over the units per em.
+    """
+    with open(font_path, "rb") as f:
+        data = f.read()
+    # Collections are measured by their first font.
+    offset = struct.unpack(">I", data[12:16])[0] if data[:4] == b"ttcf" else 0
+    num_tables = struct.unpack(">H", data[offset + 4 : offset + 6])[0]
+    tables = {}
+    for i in range(num_tables):
+        record = offset + 12 + 16 * i
+        tables[data[record : record + 4]] = struct.unpack(
+            ">I", data[record + 8 : record + 12]
+        )[0]
+
+    units_per_em = struct.unpack(">H", data[tables[b"head"] + 18 :][:2])[0]
+    win_ascent, win_descent = struct.unpack(">HH", data[tables[b"OS/2"] + 74 :][:4])
+    return (win_ascent + win_descent) / units_per_em
+
+
+@dataclass
+class AssSubtitles:
+    """
+    Word-timed subtitles styled like get_subtitle_clips(), written as an
+    ASS script for libass. Every word is an event holding its whole line,
+    with the other words transparent, so libass lays the line out and each
+    word stays in place while it is shown and animated on its own.
+    """
+
+    subtitles: list
+    screen_size: Tuple[int, int]
+    font_path: str
+    font_size: int
+    color: str = "white"
+    stroke_color: str = "black"
+    stroke_width: int = 3
+    kerning: int = -1
+    spacing: int = 0
+    offset_time: float = 0
+    y_position: float = 0.45
+    animation_duration: float = 0.05
+    move_distance: float = 0.05
+    animation: TextAnimation = TextAnimation.NONE
+    layout: SubtitleLayout = SubtitleLayout.WORDS
+
+    @property
+    def fonts_dir(self) -> str:
+        return os.path.dirname(os.path.abspath(self.font_path))
+
+    @property
+    def padding(self) -> int:
+        return self.stroke_width if self.stroke_color else 0
+
+    def get_style(self) -> str:
+        font = get_font(self.font_path, self.font_size)
+        family, style = font.getname()
+        try:
+            # libass sizes fonts by their line height rather than their em.
+            size = self.font_size * get_line_height(self.font_path)
+        except (KeyError, struct.error):
+            size = sum(font.getmetrics())
+        stroke_color = get_ass_color(self.stroke_color or self.color)
+        return ",".join(
+            map(
+                str,
+                [
+                    "Word",
+                    family,
+                    f"{size:.2f}",
+                    get_ass_color(self.color),
+                    get_ass_color(self.color),
+                    stroke_color,
+                    "&H00000000",
+                    -1 if "Bold" in style else 0,
+                    -1 if "Italic" in style or "Oblique" in style else 0,
+                    0,
+                    0,
+                    100,
+                    100,
+                    self.kerning,
+                    0,
+                    1,
+                    self.padding,
+                    0,
+                    8,
+                    0,
+                    0,
+                    0,
+                    1,
+                ],
+            )
+        )
+
+    def get_separator(self) -> str:
+        # Words are laid out without spaces, `spacing` pixels apart plus
+        # their stroke padding. The space's letter spacing makes up the
+        # difference, the kerning after the word's last letter included.
+        font = get_font(self.font_path, self.font_size)
+        gap = 2 * self.padding + self.spacing - self.kerning
+        return f"{{\\fsp{gap - font.getlength(' '):.2f}}}\\h{{\\fsp{self.kerning}}}"
+
+    def get_line_text(self, words: list, visible_index: int) -> str:
+        separator = self.get_separator()
+        parts = []
+        for i, word in enumerate(words):
+            alpha = "00" if i == visible_index else "FF"
+            text = escape_ass_text(format_word(word["word"]))
+            parts.append(f"{{\\alpha&H{alpha}&}}{text}")
+        return separator.join(parts)
+
+    def get_animation_tags(self, x, y, start, anchor) -> str:
+        # Times of \move and \fade are relative to the event start, and are
+        # negative when the animation started before the word, on the line
+        # layout.
+        if self.animation == TextAnimation.SLIDE_UP_FADE_IN:
+            t1 = round((anchor - start) * 1000)
+            t2 = t1 + round(self.animation_duration * 1000)
+            if t2 > 0:
+                y1 = y + self.move_distance * self.screen_size[1]
+                return (
+                    f"\\move({x:.2f},{y1:.2f},{x:.2f},{y:.2f},{t1},{t2})"
+                    f"\\fade(255,0,0,{t1},{t2},{t2},{t2})"
+                )
+        return f"\\pos({x:.2f},{y:.2f})"
+
+    def get_events(self, fps: float = None, start_time: float = 0) -> List[str]:
+        def snap(t):
+            # The first frame showing time t, when the frame rate is known,
+            # so words appear on the same frames as on the Python path.
+            if fps:
+                return math.ceil(t * fps - 1e-6) / fps
+            return t
+
+        x = self.screen_size[0] / 2
+        y = self.y_position * self.screen_size[1] + self.padding
+        events = []
+        for subtitle_line in self.subtitles:
+            words = subtitle_line["words"]
+            line_start = min(word["start"] for word in words) + self.offset_time
+            for i, word in enumerate(words):
+                word_start = word["start"] + self.offset_time
+                start = max(snap(word_start) - start_time, 0)
+                end = snap(word["end"] + self.offset_time) - start_time
+                if end <= start:
+                    continue
+
+                # The event starts at the centisecond before its frame.
+                start = math.floor(start * 100 + 1e-6) / 100
+                anchor = (
+                    line_start if self.layout == SubtitleLayout.LINES else word_start
+                ) - start_time
+                tags = self.get_animation_tags(x, y, start, anchor)
+                events.append(
+                    f"Dialogue: 0,{format_ass_time(start)},{format_ass_time(end)},"
+                    f"Word,,0,0,0,,{{\\an8{tags}}}{self.get_line_text(words, i)}"
+                )
+        return events
+
+    def write(self, path: str, fps: float = None, start_time: float = 0) -> str:
+        """
+        Writes the ASS script. With the output `fps`, word timings are
+        snapped to the frames that show them. Times are relative to
+        `start_time`.
+        """
+        width, height = self.screen_size
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                "[Script Info]\n"
+                "ScriptType: v4.00+\n"
+                f"PlayResX: {width}\n"
+                f"PlayResY: {height}\n"
+                "WrapStyle: 2\n"
+                "ScaledBorderAndShadow: yes\n"
+                "YCbCr Matrix: None\n"
+                "\n"
+                "[V4+ Styles]\n"
+                "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, "
+                "OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, "
+                "ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+                "Alignment, MarginL, MarginR, MarginV, Encoding\n"
+                f"Style: {self.get_style()}\n"
+                "\n"
+                "[Events]\n"
+                "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, "
+                "Effect, Text\n"
+            )
+            for event in self.get_events(fps, start_time):
+                f.write(f"{event}\n")
+        return path
+
+
+def get_ass_subtitles(
+    subtitles: list,
+    screen_size: Tuple[int, int],
+    font_path: str,
+    font_size: int,
+    color: str = "white",
+    stroke_color: str = "black",
+    stroke_width: int = 3,
+    kerning: int = -1,
+    spacing: int = 0,
+    offset_time: float = 0,
+    y_position: float = 0.45,
+    animation_duration: float = 0.05,
+    move_distance: float = 0.05,
+    animation: TextAnimation = TextAnimation.NONE,
+    layout: SubtitleLayout = SubtitleLayout.WORDS,
+) -> AssSubtitles:
+    """
+    Same options as get_subtitle_clips(), for burning the subtitles in with
+    libass while encoding instead of compositing word clips in Python.
+    """
+    return AssSubtitles(
+        subtitles=subtitles,
+        screen_size=tuple(screen_size),
+        font_path=font_path,
+        font_size=font_size,
+        color=color,
+        stroke_color=stroke_color,
+        stroke_width=stroke_width,
+        kerning=kerning,
+        spacing=spacing,
+        offset_time=offset_time,
+        y_position=y_position,
+        animation_duration=animation_duration,
+        move_distance=move_distance,
+        animation=animation,
+        layout=layout,
+    )
+
+
+@dataclass
+class WatermarkOverlay:
+    """
+    Image overlaid over the whole video by ffmpeg, like get_watermark_clip():
+    resized by `resize`, with `opacity` and a named or pixel `position` on a
+    `screen_size` frame.
+    """
+
+    image_path: str
+    screen_size: Tuple[int, int]
+    resize: float = 0.2
+    opacity: float = 0.15
+    position: Tuple[str, str] = ("center", "center")
+
+    def get_size(self, scale: float = 1) -> Tuple[int, int]:
+        with Image.open(self.image_path) as image:
+            width, height = image.size
+        return (
+            max(1, round(width * self.resize * scale)),
+            max(1, round(height * self.resize * scale)),
+        )
+
+    def get_position(self, scale: float = 1) -> Tuple[str, str]:
+        position = self.position
+        if isinstance(position, str):
+            position = {
+                "center": ("center", "center"),
+                "left": ("left", "center"),
+                "right": ("right", "center"),
+                "top": ("center", "top"),
+                "bottom": ("center", "bottom"),
+            }[position]
+
+        x, y = position
+        x = {"left": "0", "center": "(W-w)/2", "right": "W-w"}.get(x, x)
+        y = {"top": "0", "center": "(H-h)/2", "bottom": "H-h"}.get(y, y)
+        if not isinstance(x, str):
+            x = str(int(x * scale))
+        if not isinstance(y, str):
+            y = str(int(y * scale))
+        return x, y
+
+    def get_filters(self, frame_size) -> Tuple[str, str]:
+        """
+        The filter chain of the watermark source, labelled `wm`, and the
+        overlay filter blending it over the `main` input.
+        """
+        scale = frame_size[0] / self.screen_size[0]
+        width, height = self.get_size(scale)
+        x, y = self.get_position(scale)
+        source = (
+            f"movie=filename={escape_filter_value(os.path.abspath(self.image_path))},"
+            f"scale={width}:{height}:flags=area,format=rgba,"
+            f"colorchannelmixer=aa={self.opacity:.6f}[wm]"
+        )
+        return source, f"[main][wm]overlay=x={x}:y={y}:eof_action=repeat"
+
+
+def get_watermark_overlay(
+    watermark_image_path: str,
+    screen_size: Tuple[int, int],
+    resize: float = 0.2,
+    opacity: float = 0.15,
+    position: Tuple[str, str] = ("center", "center"),
+) -> WatermarkOverlay:
+    return WatermarkOverlay(
+        image_path=watermark_image_path,
+        screen_size=tuple(screen_size),
+        resize=resize,
+        opacity=opacity,
+        position=position,
+    )
+
+
+@dataclass
+class BurnIn:
+    """
+    Overlays drawn by ffmpeg while encoding rather than composited in
+    Python: a watermark through the `overlay` filter and subtitles on top
+    of it through libass with the `subtitles` filter.
+    """
+
+    subtitles: AssSubtitles = None
+    watermark: WatermarkOverlay = None
+
+    def get_filter_graph(
+        self, frame_size, ass_path: str = None, filters: List[str] = ()
+    ) -> str:
+        """
+        Filtergraph applying `filters`, then the burn-in, to frames of
+        `frame_size`, with the subtitles written to `ass_path`.
+        """
+        chain = [*filters]
+        graph = []
+        if self.watermark is not None:
+            source, overlay = self.watermark.get_filters(frame_size)
+            graph += [f"{','.join(chain or ['null'])}[main]", source]
+            chain = [overlay]
+
+        if self.subtitles is not None:
+            chain.append(
+                f"subtitles=filename={escape_filter_value(ass_path)}"
+                f":fontsdir={escape_filter_value(self.subtitles.fonts_dir)}"
+            )
+
+        graph.append(",".join(chain or ["null"]))
+        return ";\n".join(graph)
+
+    def write_filter_script(
+        self,
+        path: str,
+        frame_size,
+        fps: float,
+        filters: List[str] = (),
+        start_time: float = 0,
+    ) -> str:
+        """
+        Writes the filtergraph, passed to ffmpeg with -filter_script so long
+        graphs stay under the maximum argument length, and the ASS script
+        next to it. The subtitles of a segment starting at `start_time` are
+        shifted to the segment's own timestamps.
+        """
+        ass_path = None
+        if self.subtitles is not None:
+            ass_path = self.subtitles.write(
+                f"{os.path.splitext(path)[0]}.ass", fps=fps, start_time=start_time
+            )
+
+        with open(path, "w") as f:
+            f.write(self.get_filter_graph(frame_size, ass_path, filters=filters))
+        return path
@@ -0,0 +1,248 @@
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Tuple
+import numpy as np
+
+from .instrumentation import count
+
+__all__ = ["Compositor", "get_compositor"]
+
+
+@dataclass
+class AlphaInfo:
+    """
+    uint8 alpha of a mask, with the (top, bottom, left, right) bounding box
+    of its non-transparent pixels, or None when it is fully transparent.
+    """
+
+    alpha: np.ndarray
+    box: Tuple[int, int, int, int]
+    opaque: bool
+
+
+def get_alpha_info(mask: np.ndarray, scratch: "ScratchBuffers") -> AlphaInfo:
+    if mask.dtype == np.uint8:
+        alpha = mask
+    else:
+        scaled = scratch.get("mask", mask.shape, np.float32)
+        np.multiply(mask, 255, out=scaled, casting="same_kind")
+        scaled += 0.5
+        np.clip(scaled, 0, 255, out=scaled)
+        alpha = np.empty(mask.shape, dtype=np.uint8)
+        np.copyto(alpha, scaled, casting="unsafe")
+
+    rows = np.flatnonzero(alpha.any(axis=1))
+    if not len(rows):
+        return AlphaInfo(alpha, None, False)
+
+    columns = np.flatnonzero(alpha.any(axis=0))
+    box = (rows[0], rows[-1] + 1, columns[0], columns[-1] + 1)
+    opaque = bool((alpha[box[0] : box[1], box[2] : box[3]] == 255).all())
+    return AlphaInfo(alpha, box, opaque)
+
+
+class ScratchBuffers(threading.local):
+    """
+    Buffers reused from frame to frame, per thread, so frames rendered by
+    the pipelined writer's workers don't share them. They grow to the
+    largest layer blitted and are never shrunk.
+    """
+
+    def __init__(self) -> None:
+        self.buffers = {}
+
+    def get(self, name: str, shape, dtype) -> np.ndarray:
+        size = int(np.prod(shape))
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size < size:
+            count("compositor.allocations")
+            buffer = self.buffers[name] = np.empty(size, dtype=dtype)
+        return buffer[:size].reshape(shape)
+
+
+def get_clip_position(clip, t, frame_size, image_size) -> Tuple[int, int]:
+    """
+    Position of the clip's top-left corner at clip time `t`, resolved like
+    VideoClip.blit_on() does for named and relative positions.
+    """
+    wf, hf = frame_size
+    wi, hi = image_size
+    pos = clip.pos(t)
+
+    if isinstance(pos, str):
+        pos = {
+            "center": ["center", "center"],
+            "left": ["left", "center"],
+            "right": ["right", "center"],
+            "top": ["center", "top"],
+            "bottom": ["center", "bottom"],
+        }[pos]
+    else:
+        pos = list(pos)
+
+    if clip.relative_pos:
+        for i, dim in enumerate([wf, hf]):
+            if not isinstance(pos[i], str):
+                pos[i] = dim * pos[i]
+
+    if isinstance(pos[0], str):
+        pos[0] = {"left": 0, "center": (wf - wi) / 2, "right": wf - wi}[pos[0]]
+    if isinstance(pos[1], str):
+        pos[1] = {"top": 0, "center": (hf - hi) / 2, "bottom": hf - hi}[pos[1]]
+
+    return int(pos[0]), int(pos[1])
+
+
+class Compositor:
+    """
+    Blends uint8 RGB layers in place onto a uint8 frame, in 8-bit fixed
+    point: the premultiplied layer and the frame weighted by the inverse
+    alpha are summed in uint16 and divided by 255 with rounding. Only the
+    bounding box of the non-transparent pixels is touched, opaque boxes are
+    copied and transparent ones skipped. Intermediates live in per-thread
+    scratch buffers, so blitting a layer allocates nothing.
+
+    The alpha of masks that outlive a frame, e.g. the masks of still images
+    and words, is converted once and kept until the mask is freed. Masks
+    are expected not to be modified in place.
+    """
+
+    def __init__(self) -> None:
+        self.scratch = ScratchBuffers()
+        self.alpha_infos = {}
+
+    def get_alpha_info(self, mask: np.ndarray) -> AlphaInfo:
+        key = id(mask)
+        entry = self.alpha_infos.get(key)
+        if entry is not None and entry[0]() is mask:
+            count("cache.alpha.hits")
+            return entry[1]
+
+        count("cache.alpha.misses")
+        info = get_alpha_info(mask, self.scratch)
+        try:
+            ref = weakref.ref(mask, lambda ref: self.forget(key, ref))
+        except TypeError:
+            return info
+        self.alpha_infos[key] = (ref, info)
+        return info
+
+    def forget(self, key, ref):
+        entry = self.alpha_infos.get(key)
+        if entry is not None and entry[0] is ref:
+            del self.alpha_infos[key]
+
+    def can_blit(self, frame, image, mask=None) -> bool:
+        return (
+            frame.dtype == np.uint8
+            and frame.ndim == 3
+            and image.dtype == np.uint8
+            and image.ndim == 3
+            and image.shape[2] >= 3
+            and (mask is None or mask.shape == image.shape[:2])
+        )
+
+    def blit(
+        self,
+        frame: np.ndarray,
+        image: np.ndarray,
+        position=(0, 0),
+        mask: np.ndarray = None,
+        opacity: float = 1,
+    ) -> np.ndarray:
+        """
+        Blends `image` onto `frame` in place at the integer `position`,
+        through its `mask` (floats in [0, 1] or uint8) and a global
+        `opacity`. Only the first three channels of the image are used.
+        """
+        if opacity <= 0:
+            return frame
+
+        top, bottom, left, right = 0, image.shape[0], 0, image.shape[1]
+        info = None
+        if mask is not None:
+            info = self.get_alpha_info(mask)
+            if info.box is None:
+                return frame
+            top, bottom, left, right = info.box
+
+        # Clips the box to the frame.
+        x, y = position
+        h, w = frame.shape[:2]
+        top, bottom = max(top, -y), min(bottom, h - y)
+        left, right = max(left, -x), min(right, w - x)
+        if top >= bottom or left >= right:
+            return frame
+
+        region = frame[y + top : y + bottom, x + left : x + right]
+        src = image[top:bottom, left:right, :3]
+        opaque = info is None or info.opaque
+        if opaque and opacity >= 1:
+            region[...] = src
+            return frame
+
+        shape = (bottom - top, right - left)
+        if info is None:
+            alpha = self.scratch.get("alpha", shape, np.uint8)
+            alpha.fill(255)
+        else:
+            alpha = info.alpha[top:bottom, left:right]
+
+        if opacity < 1:
+            scaled = self.scratch.get("scaled", shape, np.uint16)
+            np.multiply(alpha, round(opacity * 256), out=scaled, dtype=np.uint16)
+            scaled >>= 8
+            alpha = self.scratch.get("opacity", shape, np.uint8)
+            np.copyto(alpha, scaled, casting="unsafe")
+
+        self.blend(region, src, alpha)
+        return frame
+
+    def blend(self, region, src, alpha):
+        # Exact rounded x / 255 for x <= 255 * 255, without overflowing uint16.
+        shape = region.shape
+        inverse = self.scratch.get("inverse", shape[:2], np.uint8)
+        np.subtract(255, alpha, out=inverse)
+
+        total = self.scratch.get("total", shape, np.uint16)
+        weighted = self.scratch.get("weighted", shape, np.uint16)
+        np.multiply(src, alpha[:, :, None], out=total, dtype=np.uint16)
+        np.multiply(region, inverse[:, :, None], out=weighted, dtype=np.uint16)
+        total += weighted
+        total += 128
+        np.right_shift(total, 8, out=weighted)
+        total += weighted
+        total >>= 8
+        np.copyto(region, total, casting="unsafe")
+
+    def blit_clip(self, frame: np.ndarray, clip, t: float) -> np.ndarray:
+        """
+        Blits the clip's frame at time `t` like VideoClip.blit_on(), in place
+        when the frame and the clip can be composited in uint8.
+        """
+        ct = t - clip.start
+        if clip.ismask:
+            return clip.blit_on(frame, t)
+
+        image = clip.get_frame(ct)
+        mask = clip.mask.get_frame(ct) if clip.mask is not None else None
+        if not self.can_blit(frame, image, mask):
+            count("compositor.fallbacks")
+            return clip.blit_on(frame, t)
+
+        x, y = get_clip_position(
+            clip, ct, (frame.shape[1], frame.shape[0]), (image.shape[1], image.shape[0])
+        )
+
+        return self.blit(frame, image, (x, y), mask=mask)
+
+
+_compositor = None
+
+
+def get_compositor() -> Compositor:
+    global _compositor
+    if _compositor is None:
+        _compositor = Compositor()
+    return _compositor
@@ -0,0 +1,45 @@
+import hashlib
+from functools import lru_cache
+import numpy as np
+
+from .static_frames import is_static
+from .utils import hash_file
+
+__all__ = ["get_content_hash", "set_content_hash"]
+
+
+def hash_values(*values) -> str:
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+
+def set_content_hash(clip, get_hash):
+    """
+    Attaches a function returning a hash of what the clip shows, e.g. of
+    its source file and decoding settings. It is called once, when the
+    hash is first needed, and is tied to the clip's current frame
+    function like mark_static().
+    """
+    clip.content_hash = (clip.make_frame, lru_cache(maxsize=None)(get_hash))
+    return clip
+
+
+def get_file_content_hash(path, *params):
+    return lambda: hash_values(hash_file(path), *params)
+
+
+def get_content_hash(clip) -> str:
+    """
+    Returns a hash of the clip's content, or None when it is unknown.
+    Static clips without a hash are hashed from their frame.
+    """
+    content_hash = getattr(clip, "content_hash", None)
+    if content_hash is not None and content_hash[0] is clip.make_frame:
+        return content_hash[1]()
+
+    if is_static(clip):
+        frame = np.ascontiguousarray(clip.get_frame(0))
+        return hash_values(
+            hashlib.sha1(memoryview(frame)).hexdigest(), frame.shape, frame.dtype.str
+        )
+
+    return None
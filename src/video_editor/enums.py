@@ -30,3 +30,38 @@ class Animation(Enum):
 class TextAnimation(Enum):
     SLIDE_UP_FADE_IN = 1
     NONE = 2
+
+
+class TextBackend(Enum):
+    IMAGEMAGICK = "imagemagick"
+    PILLOW = "pillow"
+
+
+class OutputPreset(Enum):
+    DRAFT = "draft"
+    PUBLISH = "publish"
+    ARCHIVE = "archive"
+
+
+class FitMode(Enum):
+    COVER = "cover"
+    CONTAIN = "contain"
+    PAD = "pad"
+
+
+class Resampling(Enum):
+    NEAREST = "nearest"
+    BILINEAR = "bilinear"
+    AREA = "area"
+    LANCZOS = "lanczos"
+
+
+class ResamplingBackend(Enum):
+    OPENCV = "opencv"
+    PILLOW = "pillow"
+    NUMPY = "numpy"
+
+
+class SubtitleLayout(Enum):
+    WORDS = "words"
+    LINES = "lines"
@@ -0,0 +1,180 @@
+import logging
+import math
+import os
+import threading
+import warnings
+
+from .static_frames import is_static
+
+__all__ = [
+    "FrameExtractionError",
+    "get_first_frame",
+    "get_last_frame",
+    "get_reader_lock",
+    "read_reader_frame",
+    "set_frame_reader",
+]
+
+logger = logging.getLogger(__name__)
+
+_reader_locks_lock = threading.Lock()
+
+
+class FrameExtractionError(RuntimeError):
+    def __init__(self, message: str, t: float = None) -> None:
+        super().__init__(message)
+        self.t = t
+
+
+def set_frame_reader(clip, get_reader):
+    """
+    Attaches a function returning the ffmpeg reader the clip's frames are
+    decoded from, so its last frame can be found from the stream metadata.
+    Like mark_static(), it is tied to the clip's current frame function.
+    """
+    clip.frame_reader = (clip.make_frame, get_reader)
+    return clip
+
+
+def get_reader_lock(reader) -> threading.Lock:
+    """
+    Returns the lock serializing reads from an ffmpeg reader, whose seek
+    position is shared by everything reading from it. In a forked process
+    the inherited ffmpeg pipe is dropped, without stopping the parent's
+    process, and the reader opens its own on the next read.
+    """
+    with _reader_locks_lock:
+        reader_lock = getattr(reader, "reader_lock", None)
+        if reader_lock is None or reader_lock[0] != os.getpid():
+            if reader_lock is not None:
+                reader.proc = None
+            reader_lock = reader.reader_lock = (os.getpid(), threading.Lock())
+        return reader_lock[1]
+
+
+def read_reader_frame(reader, t):
+    with get_reader_lock(reader):
+        return reader.get_frame(t)
+
+
+def get_reader(clip):
+    frame_reader = getattr(clip, "frame_reader", None)
+    if frame_reader is not None and frame_reader[0] is clip.make_frame:
+        return frame_reader[1]()
+    return None
+
+
+def get_cached_frames(clip) -> dict:
+    frame_cache = getattr(clip, "frame_cache", None)
+    if frame_cache is None or frame_cache[0] is not clip.make_frame:
+        frame_cache = clip.frame_cache = (clip.make_frame, {})
+    return frame_cache[1]
+
+
+def get_first_frame(clip):
+    frames = get_cached_frames(clip)
+    if "first" not in frames:
+        try:
+            frames["first"] = clip.get_frame(0)
+        except Exception as e:
+            raise FrameExtractionError(f"Failed to read the first frame: {e}", 0) from e
+    return frames["first"].copy()
+
+
+def get_last_frame_index(duration, fps, nframes=None) -> int:
+    # Frames are shown from i / fps, the last one starts before the end.
+    last_index = max(0, math.ceil(duration * fps - 1e-6) - 1)
+    if nframes is not None:
+        last_index = min(last_index, nframes - 1)
+    return last_index
+
+
+def read_frame(reader, index):
+    # Past the end of the stream the reader warns and returns the last frame
+    # it read instead, or raises when it just seeked there.
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        try:
+            frame = reader.get_frame(index / reader.fps)
+        except IOError:
+            return None
+    if any("bytes wanted" in str(warning.message) for warning in caught):
+        return None
+    return frame
+
+
+def read_last_frame(reader, last_index, max_attempts):
+    frame = read_frame(reader, last_index)
+    if frame is not None:
+        return frame
+
+    # The stream is shorter than its metadata says: seek once before the end
+    # and read forward, keeping the last frame decoded in full.
+    first_index = max(0, last_index - max_attempts)
+    logger.debug(
+        "Frame %d of %s is missing, reading from frame %d",
+        last_index,
+        reader.filename,
+        first_index,
+    )
+    last_frame = None
+    for index in range(first_index, last_index):
+        frame = read_frame(reader, index)
+        if frame is None:
+            break
+        last_frame = frame
+
+    if last_frame is None:
+        raise FrameExtractionError(
+            f"No frame could be decoded from {reader.filename} after frame "
+            f"{first_index}.",
+            first_index / reader.fps,
+        )
+    return last_frame
+
+
+def get_last_frame(clip, fps: float = None, max_attempts: int = 10):
+    """
+    Returns the last frame the clip shows at `fps`, by default the clip's
+    own. Clips decoded by ffmpeg are bounded by the frame count of their
+    stream, others are read at one frame, or 0.01s without an fps, before
+    their end. First and last frames are cached per clip and returned as
+    copies.
+    """
+    frames = get_cached_frames(clip)
+    if "last" in frames:
+        return frames["last"].copy()
+
+    if is_static(clip):
+        frames["last"] = get_first_frame(clip)
+        return frames["last"].copy()
+
+    reader = get_reader(clip)
+    if reader is not None:
+        # ffmpeg's frame count is rounded up from the stream duration.
+        last_index = get_last_frame_index(
+            min(clip.duration, reader.duration), reader.fps, nframes=reader.nframes
+        )
+        with get_reader_lock(reader):
+            frames["last"] = read_last_frame(reader, last_index, max_attempts)
+        return frames["last"].copy()
+
+    fps = fps or getattr(clip, "fps", None)
+    step = 1 / fps if fps else 0.01
+    t = get_last_frame_index(clip.duration, fps) / fps if fps else clip.duration - step
+
+    error = None
+    for _ in range(max_attempts):
+        if t < 0:
+            break
+        try:
+            frames["last"] = clip.get_frame(t)
+            return frames["last"].copy()
+        except Exception as e:
+            logger.debug("Failed to read the frame at %.3fs: %s", t, e)
+            error = e
+            t -= step
+
+    raise FrameExtractionError(
+        f"Failed to read the last frame before {clip.duration}s: {error}", t
+    ) from error
@@ -1,20 +1,114 @@
 from typing import Tuple
-from moviepy.editor import ImageClip
+from moviepy.video.VideoClip import ImageClip
 
+from .content_hashes import get_file_content_hash, set_content_hash
+from .enums import FitMode
+from .image_loading import (
+    get_display_size,
+    get_image_resampler,
+    load_clip_images,
+    set_zoom_source,
+)
+from .lazy_image_clips import DecodedImageCache, LazyImageClip
+from .resampling import Resampler
 from .utils import list_file_paths
 
-__all__ = ["get_image_clips", "get_watermark_clip"]
+__all__ = ["get_image_clip", "get_image_clips", "get_watermark_clip"]
 
 
-def get_image_clips(images_dir: str, total_duration: float, min_image_duration: float):
+def get_image_clip(
+    image_path: str,
+    target_size: Tuple[int, int] = None,
+    fit_mode: FitMode = FitMode.COVER,
+    zoom_headroom: float = 1,
+    cache_dir: str = None,
+    resampler: Resampler = None,
+):
+    if target_size is None:
+        return set_content_hash(
+            ImageClip(image_path), get_file_content_hash(image_path)
+        )
+
+    resampler = get_image_resampler(resampler)
+
+    display, source = load_clip_images(
+        path=image_path,
+        target_size=target_size,
+        fit_mode=fit_mode,
+        zoom_headroom=zoom_headroom,
+        display_size=get_display_size(image_path, target_size, fit_mode),
+        cache_dir=cache_dir,
+        resampler=resampler,
+    )
+
+    clip = ImageClip(display)
+    if source is not None:
+        set_zoom_source(clip, lambda: source)
+    return set_content_hash(
+        clip,
+        get_file_content_hash(
+            image_path, target_size, fit_mode, zoom_headroom, resampler.key
+        ),
+    )
+
+
+def get_image_clips(
+    images_dir: str,
+    total_duration: float,
+    min_image_duration: float,
+    target_size: Tuple[int, int] = None,
+    fit_mode: FitMode = FitMode.COVER,
+    zoom_headroom: float = 1,
+    cache_dir: str = None,
+    lazy: bool = False,
+    image_cache: DecodedImageCache = None,
+    resampler: Resampler = None,
+):
+    """
+    With `target_size` (width, height), images are decoded and downscaled
+    once to fit the output frame, with `resampler` (Lanczos by default).
+    `zoom_headroom` keeps that much extra resolution for the zoom
+    animations, e.g. the animator's zoom factor. With `lazy`, images are
+    only decoded while they are shown, through a shared DecodedImageCache.
+    """
     image_files = list_file_paths(dir_path=images_dir)
     num_images = len(image_files)
 
     if num_images == 0:
         return []
 
+    if lazy and image_cache is None:
+        image_cache = DecodedImageCache()
+
+    previous_clips = []
+
+    def get_clip(image_path):
+        if lazy:
+            clip = LazyImageClip(
+                image_path=image_path,
+                target_size=target_size,
+                fit_mode=fit_mode,
+                zoom_headroom=zoom_headroom,
+                cache_dir=cache_dir,
+                image_cache=image_cache,
+                resampler=resampler,
+            )
+            if previous_clips:
+                previous_clips[-1].next_clip = clip
+            previous_clips.append(clip)
+            return clip
+
+        return get_image_clip(
+            image_path=image_path,
+            target_size=target_size,
+            fit_mode=fit_mode,
+            zoom_headroom=zoom_headroom,
+            cache_dir=cache_dir,
+            resampler=resampler,
+        )
+
     if total_duration < min_image_duration:
-        return [ImageClip(image_files[0]).set_duration(total_duration)]
+        return [get_clip(image_files[0]).set_duration(total_duration)]
 
     max_images = total_duration // min_image_duration
     num_images_to_use = min(num_images, int(max_images))
@@ -27,7 +121,7 @@ def get_image_clips(images_dir: str, total_duration: float, min_image_duration:
         else:
             clip_duration = duration_per_image
 
-        clips.append(ImageClip(image_files[i]).set_duration(clip_duration))
+        clips.append(get_clip(image_files[i]).set_duration(clip_duration))
         total_duration -= clip_duration
 
     return clips
@@ -39,10 +133,14 @@ def get_watermark_clip(
     resize: float = 0.2,
     opacity: float = 0.15,
     position: Tuple[str, str] = ("center", "center"),
+    resampler: Resampler = None,
 ):
+    resampler = get_image_resampler(resampler)
+    clip = ImageClip(watermark_image_path)
+    size = (max(1, round(clip.w * resize)), max(1, round(clip.h * resize)))
+
     return (
-        ImageClip(watermark_image_path)
-        .resize(resize)
+        clip.fl_image(lambda frame: resampler.resample(frame, size), apply_to=["mask"])
         .set_opacity(opacity)
         .set_position(position)
         .set_duration(duration)
@@ -0,0 +1,192 @@
+import os
+import math
+import hashlib
+from typing import Tuple
+import numpy as np
+from PIL import Image
+
+from .enums import FitMode, Resampling
+from .instrumentation import count, timer
+from .resampling import Resampler, get_resampler
+from .utils import hash_file
+
+__all__ = ["get_zoom_source", "load_image", "set_zoom_source"]
+
+
+def set_zoom_source(clip, get_source):
+    """
+    Attaches a function returning a higher resolution version of the clip's
+    image, used by the zoom animations. It is tied to the clip's current
+    frame function, so clips derived with fl() don't inherit it.
+    """
+    clip.zoom_source = (clip.make_frame, get_source)
+
+
+def get_zoom_source(clip):
+    zoom_source = getattr(clip, "zoom_source", None)
+    if zoom_source is None or zoom_source[0] is not clip.make_frame:
+        return None
+    return zoom_source[1]
+
+
+def get_image_resampler(resampler: Resampler = None) -> Resampler:
+    return resampler or get_resampler(quality=Resampling.LANCZOS)
+
+
+def get_fit_size(image_size, target_size, fit_mode: FitMode):
+    image_w, image_h = image_size
+    target_w, target_h = target_size
+
+    if fit_mode == FitMode.COVER:
+        scale = max(target_w / image_w, target_h / image_h)
+    else:
+        scale = min(target_w / image_w, target_h / image_h)
+
+    return scale, (
+        max(1, round(image_w * scale)),
+        max(1, round(image_h * scale)),
+    )
+
+
+def fit_image(
+    image: Image.Image, target_size, fit_mode: FitMode, pad_color, resampler
+) -> np.ndarray:
+    target_w, target_h = target_size
+    scale, (fit_w, fit_h) = get_fit_size(image.size, target_size, fit_mode)
+
+    # Let the JPEG decoder skip the resolution that is thrown away anyway.
+    image.draft(
+        image.mode, (math.ceil(image.width * scale), math.ceil(image.height * scale))
+    )
+    scale, (fit_w, fit_h) = get_fit_size(image.size, target_size, fit_mode)
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    array = np.asarray(image)
+
+    if fit_mode == FitMode.COVER:
+        box_w = min(target_w / scale, image.width)
+        box_h = min(target_h / scale, image.height)
+        left = (image.width - box_w) / 2
+        top = (image.height - box_h) / 2
+        return resampler.resample(
+            array, (target_w, target_h), box=(left, top, left + box_w, top + box_h)
+        )
+
+    array = resampler.resample(array, (fit_w, fit_h))
+
+    if fit_mode == FitMode.PAD:
+        color = tuple(pad_color) + ((255,) if image.mode == "RGBA" else ())
+        canvas = np.empty((target_h, target_w, len(color)), dtype=np.uint8)
+        canvas[:] = color
+        left = (target_w - fit_w) // 2
+        top = (target_h - fit_h) // 2
+        canvas[top : top + fit_h, left : left + fit_w] = array
+        array = canvas
+
+    return array
+
+
+def get_cache_path(cache_dir, path, target_size, fit_mode, pad_color, resampler):
+    key = repr(
+        (
+            hash_file(path),
+            tuple(target_size),
+            fit_mode.value,
+            tuple(pad_color),
+            resampler.key,
+        )
+    )
+    return os.path.join(cache_dir, f"{hashlib.sha1(key.encode()).hexdigest()}.npy")
+
+
+def load_image(
+    path: str,
+    target_size: Tuple[int, int],
+    fit_mode: FitMode = FitMode.COVER,
+    pad_color: Tuple[int, int, int] = (0, 0, 0),
+    cache_dir: str = None,
+    resampler: Resampler = None,
+) -> np.ndarray:
+    """
+    Decodes an image straight to `target_size` (width, height) with the
+    given fit mode. COVER fills the target and crops the overflow, CONTAIN
+    fits the whole image inside the target, and PAD fits it and fills the
+    rest with `pad_color`. Images are downscaled with `resampler`, Lanczos
+    by default. With `cache_dir`, resized images are kept on disk keyed by
+    the file hash and the requested size.
+    """
+    target_size = tuple(int(round(size)) for size in target_size)
+    resampler = get_image_resampler(resampler)
+
+    cache_path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = get_cache_path(
+            cache_dir, path, target_size, fit_mode, pad_color, resampler
+        )
+        if os.path.isfile(cache_path):
+            try:
+                array = np.load(cache_path)
+                count("cache.resized_images.hits")
+                return array
+            except (OSError, ValueError):
+                pass
+        count("cache.resized_images.misses")
+
+    with timer("image.decode"), Image.open(path) as image:
+        array = fit_image(image, target_size, fit_mode, pad_color, resampler)
+
+    if cache_path:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, cache_path)
+
+    return array
+
+
+def get_display_size(path: str, target_size, fit_mode: FitMode):
+    if target_size is not None and fit_mode != FitMode.CONTAIN:
+        return tuple(target_size)
+
+    with Image.open(path) as image:
+        if target_size is None:
+            return image.size
+        _, fit_size = get_fit_size(image.size, target_size, fit_mode)
+        return fit_size
+
+
+def load_clip_images(
+    path: str,
+    target_size: Tuple[int, int],
+    fit_mode: FitMode,
+    zoom_headroom: float,
+    display_size: Tuple[int, int],
+    cache_dir: str = None,
+    resampler: Resampler = None,
+):
+    """
+    Returns the image shown by the clip, at `display_size`, and the larger
+    zoom source when `zoom_headroom` asks for one.
+    """
+    resampler = get_image_resampler(resampler)
+
+    if target_size is None:
+        with Image.open(path) as image:
+            return np.asarray(image.convert("RGB")), None
+
+    source = load_image(
+        path=path,
+        target_size=(target_size[0] * zoom_headroom, target_size[1] * zoom_headroom),
+        fit_mode=fit_mode,
+        cache_dir=cache_dir,
+        resampler=resampler,
+    )
+
+    if zoom_headroom <= 1 and source.shape[1::-1] == tuple(display_size):
+        return source, None
+
+    with timer("image.resample"):
+        display = resampler.resample(source, tuple(display_size))
+    return display, source[:, :, :3]
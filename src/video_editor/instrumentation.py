@@ -0,0 +1,189 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = [
+    "Instrumentation",
+    "JsonSink",
+    "LoggingSink",
+    "disable_instrumentation",
+    "enable_instrumentation",
+    "get_instrumentation",
+    "instrumented",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux.
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024
+
+
+class Instrumentation:
+    """
+    Collects timers and counters from the render pipeline. Timers keep the
+    count, total and maximum duration of each stage. Counters named
+    "<name>.hits" and "<name>.misses" are reported as a hit rate.
+    """
+
+    def __init__(self, sinks=None) -> None:
+        self.sinks = list(sinks or [])
+        self.timers = {}
+        self.counters = {}
+        self.start_time = perf_counter()
+        self.last_report = None
+        self._lock = threading.Lock()
+
+    def add_time(self, name: str, elapsed: float):
+        with self._lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                self.timers[name] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, perf_counter() - start)
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> dict:
+        with self._lock:
+            timers = {
+                name: {
+                    "count": count,
+                    "total": total,
+                    "mean": total / count,
+                    "max": max_time,
+                }
+                for name, (count, total, max_time) in sorted(self.timers.items())
+            }
+            counters = dict(sorted(self.counters.items()))
+
+        hit_rates = {}
+        for name, hits in counters.items():
+            if name.endswith(".hits"):
+                prefix = name[: -len(".hits")]
+                total = hits + counters.get(f"{prefix}.misses", 0)
+                hit_rates[prefix] = hits / total if total else None
+
+        return {
+            "wall_time": perf_counter() - self.start_time,
+            "timers": timers,
+            "counters": counters,
+            "hit_rates": hit_rates,
+            "peak_rss_mb": get_peak_rss_mb(),
+        }
+
+    def emit(self) -> dict:
+        report = self.last_report = self.report()
+        for sink in self.sinks:
+            sink(report)
+        return report
+
+
+class LoggingSink:
+    def __init__(self, logger: logging.Logger = logger, level=logging.INFO) -> None:
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, report: dict):
+        lines = [f"Render profile, {report['wall_time']:.2f}s wall time:"]
+        for name, stats in report["timers"].items():
+            lines.append(
+                f"  {name}: {stats['count']} x {stats['mean'] * 1000:.2f}ms = "
+                f"{stats['total']:.2f}s (max {stats['max'] * 1000:.2f}ms)"
+            )
+        for name, value in report["counters"].items():
+            lines.append(f"  {name}: {value}")
+        for name, rate in report["hit_rates"].items():
+            if rate is not None:
+                lines.append(f"  {name} hit rate: {rate:.1%}")
+        if report["peak_rss_mb"] is not None:
+            lines.append(f"  peak RSS: {report['peak_rss_mb']:.0f} MB")
+        self.logger.log(self.level, "\n".join(lines))
+
+
+class JsonSink:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __call__(self, report: dict):
+        with open(self.path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+_instrumentation = None
+_null_timer = nullcontext()
+
+
+def get_instrumentation() -> Instrumentation:
+    return _instrumentation
+
+
+def enable_instrumentation(*sinks) -> Instrumentation:
+    """
+    Starts collecting timers and counters. Sinks are callables receiving
+    the report, e.g. LoggingSink(), JsonSink(path) or any callback.
+    """
+    global _instrumentation
+    _instrumentation = Instrumentation(sinks)
+    return _instrumentation
+
+
+def disable_instrumentation() -> dict:
+    """
+    Stops collecting and sends the report to the sinks.
+    """
+    global _instrumentation
+    instrumentation, _instrumentation = _instrumentation, None
+    if instrumentation is None:
+        return None
+    return instrumentation.emit()
+
+
+@contextmanager
+def instrumented(*sinks):
+    global _instrumentation
+    previous = _instrumentation
+    instrumentation = enable_instrumentation(*sinks)
+    try:
+        yield instrumentation
+    finally:
+        _instrumentation = previous
+        instrumentation.emit()
+
+
+def timer(name: str):
+    """
+    Times a block when instrumentation is enabled, and is a shared no-op
+    context manager otherwise.
+    """
+    if _instrumentation is None:
+        return _null_timer
+    return _instrumentation.timer(name)
+
+
+def count(name: str, value: int = 1):
+    if _instrumentation is not None:
+        _instrumentation.count(name, value)
@@ -0,0 +1,165 @@
+import os
+import threading
+from typing import Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from moviepy.video.VideoClip import VideoClip
+
+from .content_hashes import get_file_content_hash, set_content_hash
+from .enums import FitMode
+from .instrumentation import count
+from .image_loading import (
+    get_display_size,
+    get_image_resampler,
+    load_clip_images,
+    set_zoom_source,
+)
+from .resampling import Resampler
+from .static_frames import mark_static
+
+__all__ = ["DecodedImageCache", "LazyImageClip"]
+
+
+class DecodedImageCache:
+    """
+    Small LRU of decoded images shared by lazy image clips, with a
+    background thread decoding upcoming images before they are shown.
+    """
+
+    def __init__(self, max_images: int = 3, prefetch: bool = True) -> None:
+        self.max_images = max_images
+        self.prefetch_enabled = prefetch
+        self.hits = 0
+        self.misses = 0
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _check_fork(self):
+        # Threads, locks and pending futures don't survive a fork, e.g. in
+        # the segment writer's worker processes.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_images:
+            self._entries.popitem(last=False)
+
+    def get(self, key, load):
+        self._check_fork()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count("cache.images.hits")
+                return self._entries[key]
+            future = self._pending.get(key)
+            if future is None:
+                self.misses += 1
+                count("cache.images.misses")
+            else:
+                count("cache.images.prefetched")
+
+        if future is not None:
+            return future.result()
+
+        value = load()
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def prefetch(self, key, load):
+        if not self.prefetch_enabled:
+            return
+
+        self._check_fork()
+
+        def task():
+            value = load()
+            with self._lock:
+                self._pending.pop(key, None)
+                self._store(key, value)
+            return value
+
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            self._pending[key] = self._executor.submit(task)
+
+
+class LazyImageClip(VideoClip):
+    """
+    Image clip that decodes its image on first access and keeps it only in
+    the shared DecodedImageCache. Accessing a clip prefetches `next_clip`, so
+    peak memory follows the number of visible clips rather than the number
+    of images. Transparency is not kept.
+    """
+
+    def __init__(
+        self,
+        image_path: str,
+        target_size: Tuple[int, int] = None,
+        fit_mode: FitMode = FitMode.COVER,
+        zoom_headroom: float = 1,
+        cache_dir: str = None,
+        image_cache: DecodedImageCache = None,
+        duration: float = None,
+        resampler: Resampler = None,
+    ) -> None:
+        super().__init__(duration=duration)
+
+        self.image_path = image_path
+        self.target_size = target_size
+        self.fit_mode = fit_mode
+        self.zoom_headroom = zoom_headroom
+        self.cache_dir = cache_dir
+        self.image_cache = image_cache or DecodedImageCache()
+        self.resampler = get_image_resampler(resampler)
+        self.next_clip = None
+
+        self.size = get_display_size(image_path, target_size, fit_mode)
+        self.make_frame = lambda t: self.get_images()[0]
+        mark_static(self)
+        set_content_hash(self, get_file_content_hash(*self.cache_key))
+
+        if target_size is not None and zoom_headroom > 1:
+            set_zoom_source(self, lambda: self.get_images()[1])
+
+    @property
+    def cache_key(self):
+        return (
+            self.image_path,
+            self.target_size,
+            self.fit_mode,
+            self.zoom_headroom,
+            self.resampler.key,
+        )
+
+    def load_images(self):
+        display, source = load_clip_images(
+            path=self.image_path,
+            target_size=self.target_size,
+            fit_mode=self.fit_mode,
+            zoom_headroom=self.zoom_headroom,
+            display_size=self.size,
+            cache_dir=self.cache_dir,
+            resampler=self.resampler,
+        )
+        return display[:, :, :3], source
+
+    def get_images(self):
+        images = self.image_cache.get(self.cache_key, self.load_images)
+        if self.next_clip is not None:
+            self.image_cache.prefetch(
+                self.next_clip.cache_key, self.next_clip.load_images
+            )
+        return images
@@ -0,0 +1,105 @@
+from dataclasses import dataclass, replace
+
+from .enums import OutputPreset, Resampling
+from .resampling import get_resampler
+
+__all__ = ["OutputProfile", "get_output_profile"]
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """
+    Encoder settings used by write_video. The defaults reproduce the
+    previous hard-coded settings. `preview_scale` renders the video at a
+    fraction of its size, e.g. 0.5 for quick previews.
+    """
+
+    fps: float = 30
+    codec: str = "libx264"
+    preset: str = "ultrafast"
+    crf: int = None
+    tune: str = None
+    pixel_format: str = None
+    bitrate: str = None
+    audio_codec: str = "libmp3lame"
+    audio_bitrate: str = None
+    audio_fps: int = 44100
+    preview_scale: float = None
+    threads: int = None
+
+    def replace(self, **changes) -> "OutputProfile":
+        return replace(self, **changes)
+
+    def get_pixel_format(self, size):
+        if self.pixel_format:
+            return self.pixel_format
+        # Same default as moviepy: yuv420p when x264 can encode it.
+        if self.codec == "libx264" and size[0] % 2 == 0 and size[1] % 2 == 0:
+            return "yuv420p"
+        return None
+
+    def get_video_args(self, size, threads=None) -> list:
+        args = ["-vcodec", self.codec]
+        if self.preset:
+            args += ["-preset", self.preset]
+        if self.crf is not None:
+            args += ["-crf", str(self.crf)]
+        if self.tune:
+            args += ["-tune", self.tune]
+        if self.bitrate:
+            args += ["-b:v", self.bitrate]
+
+        threads = threads or self.threads
+        if threads:
+            args += ["-threads", str(threads)]
+
+        pixel_format = self.get_pixel_format(size)
+        if pixel_format:
+            args += ["-pix_fmt", pixel_format]
+        return args
+
+    def get_output_size(self, size):
+        if not self.preview_scale or self.preview_scale == 1:
+            return tuple(size)
+        return (
+            max(1, round(size[0] * self.preview_scale)),
+            max(1, round(size[1] * self.preview_scale)),
+        )
+
+    def prepare_clip(self, clip):
+        size = self.get_output_size(clip.size)
+        if size != tuple(clip.size):
+            resampler = get_resampler(quality=Resampling.AREA)
+            clip = clip.fl_image(
+                lambda frame: resampler.resample(frame, size), apply_to=["mask"]
+            )
+        return clip
+
+
+_output_profiles = {
+    OutputPreset.DRAFT: OutputProfile(
+        preset="ultrafast",
+        crf=28,
+        audio_bitrate="96k",
+        preview_scale=0.5,
+    ),
+    OutputPreset.PUBLISH: OutputProfile(
+        preset="medium",
+        crf=21,
+        pixel_format="yuv420p",
+        audio_codec="aac",
+        audio_bitrate="192k",
+    ),
+    OutputPreset.ARCHIVE: OutputProfile(
+        preset="slow",
+        crf=16,
+        pixel_format="yuv420p",
+        audio_codec="aac",
+        audio_bitrate="320k",
+    ),
+}
+
+
+def get_output_profile(preset: OutputPreset = None, **overrides) -> OutputProfile:
+    profile = _output_profiles[preset] if preset else OutputProfile()
+    return profile.replace(**overrides) if overrides else profile
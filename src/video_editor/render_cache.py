@@ -0,0 +1,229 @@
+import os
+import glob
+import threading
+from collections import OrderedDict
+from moviepy.video.VideoClip import VideoClip
+from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader
+
+from .content_hashes import get_content_hash, hash_values, set_content_hash
+from .enums import Animation, Resampling
+from .frame_extraction import get_reader_lock, read_reader_frame, set_frame_reader
+from .instrumentation import count, timer
+from .output_profiles import OutputProfile
+from .resampling import Resampler, get_resampler
+from .video_animations import animate_clip
+from .video_writers import get_num_frames, write_frames
+
+__all__ = ["RenderCache", "CachedVideoClip"]
+
+
+class RenderCache:
+    """
+    Content-addressed cache of rendered clips on disk. Clips are encoded
+    losslessly with libx264rgb at `fps`, one file per key, and the least
+    recently used files are removed once the cache grows over `max_bytes`.
+    At most `max_readers` cached files are kept open for reading.
+    """
+
+    extension = ".mkv"
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = 4 * 1024**3,
+        fps: float = 30,
+        max_readers: int = 4,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fps = fps
+        self.max_readers = max_readers
+        self.profile = OutputProfile(
+            fps=fps, codec="libx264rgb", crf=0, pixel_format="rgb24"
+        )
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._readers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_fork(self):
+        # Readers are ffmpeg subprocesses whose pipes can't be shared with
+        # forked workers, those open their own.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.extension)
+
+    def get(self, key: str) -> str:
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        return path
+
+    def put(self, key: str, clip) -> str:
+        path = self.get_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp{self.extension}"
+        try:
+            write_frames(
+                clip,
+                tmp_path,
+                self.profile,
+                0,
+                max(1, get_num_frames(clip, self.fps)),
+                threads=1,
+            )
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: str = None):
+        paths = glob.glob(os.path.join(self.cache_dir, "*" + self.extension))
+        entries = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def get_clip(self, key: str, make_clip) -> "CachedVideoClip":
+        """
+        Returns the cached clip for `key`, rendering `make_clip()` into the
+        cache first when it isn't there yet.
+        """
+        path = self.get(key)
+        if path is None:
+            self.misses += 1
+            count("cache.renders.misses")
+            clip = make_clip()
+            with timer("render_cache.write"):
+                path = self.put(key, clip)
+            duration = clip.duration
+        else:
+            self.hits += 1
+            count("cache.renders.hits")
+            duration = None
+
+        cached_clip = CachedVideoClip(path, render_cache=self, duration=duration)
+        return set_content_hash(cached_clip, lambda: key)
+
+    def get_reader(self, path: str) -> FFMPEG_VideoReader:
+        self._check_fork()
+        with self._lock:
+            reader = self._readers.get(path)
+            if reader is not None:
+                self._readers.move_to_end(path)
+                return reader
+
+            reader = FFMPEG_VideoReader(path)
+            get_reader_lock(reader)
+            self._readers[path] = reader
+            while len(self._readers) > self.max_readers:
+                _, closed_reader = self._readers.popitem(last=False)
+                with get_reader_lock(closed_reader):
+                    closed_reader.close()
+            return reader
+
+    def close(self):
+        with self._lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+
+
+class CachedVideoClip(VideoClip):
+    """
+    Clip read back from a RenderCache file. Its ffmpeg reader is opened on
+    first access and shared through the cache, so many cached clips don't
+    keep as many ffmpeg processes running.
+    """
+
+    def __init__(
+        self, path: str, render_cache: RenderCache, duration: float = None
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.render_cache = render_cache
+
+        reader = render_cache.get_reader(path)
+        self.size = tuple(reader.size)
+        self.fps = reader.fps
+        self.duration = self.end = duration if duration else reader.duration
+        self.make_frame = lambda t: read_reader_frame(
+            self.render_cache.get_reader(path), t
+        )
+        set_frame_reader(self, lambda: self.render_cache.get_reader(path))
+
+
+def get_animated_clip(
+    clip,
+    animation: Animation,
+    duration=None,
+    factor=1.3,
+    smoothness=4,
+    render_cache: RenderCache = None,
+    resampler: Resampler = None,
+):
+    """
+    Same as animate_clip(), read from the render cache when the clip's
+    content hash is known. Clips with masks aren't cached.
+    """
+    if duration is None:
+        duration = clip.duration
+    if resampler is None:
+        resampler = get_resampler(quality=Resampling.BILINEAR)
+
+    def make_clip():
+        return animate_clip(
+            clip=clip,
+            animation=animation,
+            duration=duration,
+            factor=factor,
+            smoothness=smoothness,
+            resampler=resampler,
+        )
+
+    if render_cache is None or animation == Animation.NONE or clip.mask is not None:
+        return make_clip()
+
+    content_hash = get_content_hash(clip)
+    if content_hash is None:
+        return make_clip()
+
+    key = hash_values(
+        content_hash,
+        animation.value,
+        duration,
+        factor,
+        smoothness,
+        resampler.key,
+        tuple(clip.size),
+        render_cache.fps,
+    )
+    cached_clip = render_cache.get_clip(key, make_clip).set_duration(duration)
+    if clip.audio is not None:
+        cached_clip = cached_clip.set_audio(clip.audio)
+    return cached_clip
@@ -0,0 +1,475 @@
+import json
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import List, Tuple
+import numpy as np
+from moviepy.audio.AudioClip import CompositeAudioClip
+from moviepy.video.VideoClip import VideoClip
+
+from .compositing import get_compositor
+from .content_hashes import get_content_hash, hash_values
+from .enums import Animation, Direction, EnterTransition, ExitTransition
+from .frame_extraction import get_cached_frames, get_first_frame, get_last_frame
+from .instrumentation import timer
+from .render_cache import RenderCache, get_animated_clip
+from .resampling import Resampler
+from .video_animations import get_slide_position_func
+
+__all__ = [
+    "AnimationPlan",
+    "ClipPlan",
+    "LayerPlan",
+    "SegmentPlan",
+    "RenderPlan",
+    "RenderPlanClip",
+    "compile_render_plan",
+]
+
+
+def enum_to_value(value):
+    return value.value if value is not None else None
+
+
+def value_to_enum(enum_type, value):
+    return enum_type(value) if value is not None else None
+
+
+@dataclass
+class ClipPlan:
+    """
+    Decisions of AutoVideoClipsAnimator for one source clip. `start` and
+    `end` include slide transitions, `clip_start` is when the source clip
+    itself starts.
+    """
+
+    index: int
+    start: float
+    clip_start: float
+    end: float
+    animation: Animation = Animation.NONE
+    enter_transition: EnterTransition = EnterTransition.NONE
+    exit_transition: ExitTransition = ExitTransition.NONE
+    enter_direction: Direction = None
+    exit_direction: Direction = None
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "animation": self.animation.value,
+            "enter_transition": self.enter_transition.value,
+            "exit_transition": self.exit_transition.value,
+            "enter_direction": enum_to_value(self.enter_direction),
+            "exit_direction": enum_to_value(self.exit_direction),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ClipPlan":
+        return cls(
+            **{
+                **data,
+                "animation": Animation(data["animation"]),
+                "enter_transition": EnterTransition(data["enter_transition"]),
+                "exit_transition": ExitTransition(data["exit_transition"]),
+                "enter_direction": value_to_enum(Direction, data["enter_direction"]),
+                "exit_direction": value_to_enum(Direction, data["exit_direction"]),
+            }
+        )
+
+
+@dataclass
+class AnimationPlan:
+    """
+    Everything AutoVideoClipsAnimator decided for a list of clips, enough
+    to replay it exactly. `animation` is the last animation, to chain the
+    next call. `source_hashes` are the content hashes of the clips, when
+    known, computed from `source_clips` when first needed.
+    """
+
+    clips: List[ClipPlan]
+    animation: Animation = Animation.NONE
+    transition_duration: float = 0.3
+    zoom_factor: float = 1.4
+    zoom_smoothness: float = 1.4
+    source_hashes: List[str] = None
+    source_clips: list = field(default=None, repr=False, compare=False)
+
+    def get_source_hashes(self) -> List[str]:
+        # Hashing reads whole source files, only plans that are saved or
+        # fingerprinted need it.
+        if self.source_hashes is None and self.source_clips is not None:
+            self.source_hashes = get_source_hashes(self.source_clips)
+        return self.source_hashes
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the plan and its sources, or None when a source has no
+        content hash. Equal fingerprints render the same video.
+        """
+        source_hashes = self.get_source_hashes()
+        if source_hashes is None or None in source_hashes:
+            return None
+        return hash_values(json.dumps(self.to_dict(), sort_keys=True))
+
+    def to_dict(self) -> dict:
+        return {
+            "clips": [clip_plan.to_dict() for clip_plan in self.clips],
+            "animation": self.animation.value,
+            "transition_duration": self.transition_duration,
+            "zoom_factor": self.zoom_factor,
+            "zoom_smoothness": self.zoom_smoothness,
+            "source_hashes": self.get_source_hashes(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AnimationPlan":
+        return cls(
+            **{
+                **data,
+                "clips": [ClipPlan.from_dict(clip_plan) for clip_plan in data["clips"]],
+                "animation": Animation(data["animation"]),
+            }
+        )
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "AnimationPlan":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def get_source_hashes(clips) -> List[str]:
+    return [get_content_hash(clip) for clip in clips]
+
+
+@dataclass
+class LayerPlan:
+    """
+    One source clip shown between `start` and `end`, animated as if it
+    started at `animation_start`. Still layers freeze the first or last
+    animated frame, e.g. to slide it in or out in `direction`.
+    """
+
+    source: int
+    start: float
+    end: float
+    animation: Animation = Animation.NONE
+    animation_start: float = 0
+    animation_duration: float = 0
+    still: str = None
+    fade_in: float = 0
+    fade_out: float = 0
+    slide: str = None
+    slide_duration: float = 0
+    direction: Direction = None
+
+    def get_alpha(self, t) -> float:
+        layer_time = t - self.start
+        if self.fade_in and layer_time < self.fade_in:
+            return layer_time / self.fade_in
+        if self.fade_out and self.end - t < self.fade_out:
+            return (self.end - t) / self.fade_out
+        return 1
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "animation": self.animation.value,
+            "direction": enum_to_value(self.direction),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LayerPlan":
+        return cls(
+            **{
+                **data,
+                "animation": Animation(data["animation"]),
+                "direction": value_to_enum(Direction, data["direction"]),
+            }
+        )
+
+
+@dataclass
+class SegmentPlan:
+    start: float
+    end: float
+    layers: List[int] = field(default_factory=list)
+
+
+@dataclass
+class RenderPlan:
+    """
+    Flat timeline: layers in z-order (bottom first) and the time segments
+    between layer boundaries, each listing the layers it shows.
+    """
+
+    size: Tuple[int, int]
+    duration: float
+    layers: List[LayerPlan]
+    segments: List[SegmentPlan]
+    zoom_factor: float = 1.4
+    zoom_smoothness: float = 1.4
+
+    def to_dict(self) -> dict:
+        return {
+            "size": list(self.size),
+            "duration": self.duration,
+            "layers": [layer.to_dict() for layer in self.layers],
+            "segments": [asdict(segment) for segment in self.segments],
+            "zoom_factor": self.zoom_factor,
+            "zoom_smoothness": self.zoom_smoothness,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RenderPlan":
+        return cls(
+            size=tuple(data["size"]),
+            duration=data["duration"],
+            layers=[LayerPlan.from_dict(layer) for layer in data["layers"]],
+            segments=[SegmentPlan(**segment) for segment in data["segments"]],
+            zoom_factor=data["zoom_factor"],
+            zoom_smoothness=data["zoom_smoothness"],
+        )
+
+
+def get_clip_layers(clip_plan: ClipPlan, clip, transition_duration):
+    clip_end = clip_plan.clip_start + clip.duration
+    animation = dict(
+        source=clip_plan.index,
+        animation=clip_plan.animation,
+        animation_start=clip_plan.clip_start,
+        animation_duration=clip.duration,
+    )
+    layers = []
+
+    if clip_plan.enter_transition == EnterTransition.SLIDEIN:
+        layers.append(
+            LayerPlan(
+                start=clip_plan.start,
+                end=clip_plan.clip_start,
+                still="first",
+                slide="in",
+                slide_duration=transition_duration,
+                direction=clip_plan.enter_direction,
+                **animation,
+            )
+        )
+
+    layer = LayerPlan(start=clip_plan.clip_start, end=clip_end, **animation)
+    if clip_plan.enter_transition == EnterTransition.FADEIN:
+        layer.fade_in = transition_duration / 2
+    if clip_plan.exit_transition == ExitTransition.FADEOUT:
+        layer.fade_out = transition_duration / 2
+    layers.append(layer)
+
+    if clip_plan.exit_transition == ExitTransition.SLIDEOUT:
+        layers.append(
+            LayerPlan(
+                start=clip_end,
+                end=clip_plan.end,
+                still="last",
+                slide="out",
+                slide_duration=transition_duration,
+                direction=clip_plan.exit_direction,
+                **animation,
+            )
+        )
+
+    return layers
+
+
+def get_segments(layers: List[LayerPlan]) -> List[SegmentPlan]:
+    times = sorted({time for layer in layers for time in (layer.start, layer.end)})
+    return [
+        SegmentPlan(
+            start=start,
+            end=end,
+            layers=[
+                i
+                for i, layer in enumerate(layers)
+                if layer.start <= start and end <= layer.end
+            ],
+        )
+        for start, end in zip(times, times[1:])
+    ]
+
+
+def compile_render_plan(
+    clip_plans: List[ClipPlan],
+    clips: List[VideoClip],
+    transition_duration: float = 0.3,
+    zoom_factor: float = 1.4,
+    zoom_smoothness: float = 1.4,
+) -> RenderPlan:
+    """
+    Flattens the animator's z-ordered clip plans into layers, so frames are
+    rendered without nested composites.
+    """
+    layers = [
+        layer
+        for clip_plan in clip_plans
+        for layer in get_clip_layers(
+            clip_plan, clips[clip_plan.index], transition_duration
+        )
+    ]
+
+    return RenderPlan(
+        size=tuple(clips[clip_plans[0].index].size),
+        duration=max(layer.end for layer in layers),
+        layers=layers,
+        segments=get_segments(layers),
+        zoom_factor=zoom_factor,
+        zoom_smoothness=zoom_smoothness,
+    )
+
+
+def blit(canvas, frame, position, alpha):
+    x, y = position
+    frame_h, frame_w = frame.shape[:2]
+    canvas_h, canvas_w = canvas.shape[:2]
+
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + frame_w, canvas_w), min(y + frame_h, canvas_h)
+    if x1 >= x2 or y1 >= y2:
+        return
+
+    region = frame[y1 - y : y2 - y, x1 - x : x2 - x]
+    if np.isscalar(alpha):
+        if alpha >= 1:
+            canvas[y1:y2, x1:x2] = region
+            return
+    else:
+        alpha = alpha[y1 - y : y2 - y, x1 - x : x2 - x, None]
+
+    target = canvas[y1:y2, x1:x2].astype(np.float32)
+    canvas[y1:y2, x1:x2] = target + (region - target) * alpha
+
+
+class RenderPlanClip(VideoClip):
+    """
+    Renders a RenderPlan from its source clips: each frame blits the
+    layers of the current segment onto one canvas.
+    """
+
+    # Slides show at most two stills, those of the current and the next
+    # segments are kept.
+    max_still_frames = 4
+
+    def __init__(
+        self,
+        plan: RenderPlan,
+        clips: List[VideoClip],
+        render_cache: RenderCache = None,
+        resampler: Resampler = None,
+    ) -> None:
+        super().__init__()
+        self.plan = plan
+        self.clips = clips
+        self.render_cache = render_cache
+        self.resampler = resampler
+        self.size = tuple(plan.size)
+        self.duration = self.end = plan.duration
+        self.segment_starts = [segment.start for segment in plan.segments]
+        self.animated_clips = {}
+        self.still_frames = OrderedDict()
+        self.still_frames_lock = threading.Lock()
+        self.compositor = get_compositor()
+        self.make_frame = self.render_frame
+
+        audio_clips = [
+            clips[layer.source].audio.set_start(layer.start)
+            for layer in plan.layers
+            if layer.still is None and clips[layer.source].audio is not None
+        ]
+        if audio_clips:
+            self.audio = CompositeAudioClip(audio_clips).set_duration(self.duration)
+
+    def get_animated_clip(self, layer: LayerPlan):
+        key = (layer.source, layer.animation, layer.animation_duration)
+        if key not in self.animated_clips:
+            self.animated_clips[key] = get_animated_clip(
+                clip=self.clips[layer.source],
+                animation=layer.animation,
+                duration=layer.animation_duration,
+                factor=self.plan.zoom_factor,
+                smoothness=self.plan.zoom_smoothness,
+                render_cache=self.render_cache,
+                resampler=self.resampler,
+            )
+        return self.animated_clips[key]
+
+    def get_layer_frame(self, layer: LayerPlan, t):
+        clip = self.get_animated_clip(layer)
+
+        if layer.still is not None:
+            return self.get_still_frame(clip, layer.still), 1
+
+        clip_time = t - layer.animation_start
+        mask = 1
+        if clip.mask is not None:
+            mask = clip.mask.get_frame(clip_time)
+        return clip.get_frame(clip_time), mask
+
+    def get_still_frame(self, clip, still: str):
+        key = (id(clip), still)
+        with self.still_frames_lock:
+            frame = self.still_frames.get(key)
+            if frame is not None:
+                self.still_frames.move_to_end(key)
+                return frame
+
+        if still == "first":
+            frame = get_first_frame(clip)
+        else:
+            frame = get_last_frame(clip)
+        # Only the copy kept here is cached, so evicted stills are freed.
+        get_cached_frames(clip).clear()
+
+        with self.still_frames_lock:
+            self.still_frames[key] = frame
+            while len(self.still_frames) > self.max_still_frames:
+                self.still_frames.popitem(last=False)
+        return frame
+
+    def get_layer_position(self, layer: LayerPlan, frame, t):
+        if layer.slide is None:
+            return 0, 0
+
+        get_position = get_slide_position_func(
+            layer.direction,
+            (frame.shape[1], frame.shape[0]),
+            layer.slide_duration,
+            slide_out=layer.slide == "out",
+        )
+        return tuple(int(value) for value in get_position(t - layer.start))
+
+    def render_frame(self, t):
+        with timer("frame.render_plan"):
+            return self.render_layers(t)
+
+    def render_layers(self, t):
+        canvas = np.zeros((self.size[1], self.size[0], 3), dtype=np.uint8)
+
+        index = bisect_right(self.segment_starts, t) - 1
+        if index < 0:
+            return canvas
+
+        for layer_index in self.plan.segments[index].layers:
+            layer = self.plan.layers[layer_index]
+            frame, mask = self.get_layer_frame(layer, t)
+            alpha = layer.get_alpha(t)
+            position = self.get_layer_position(layer, frame, t)
+            if np.isscalar(mask):
+                mask = None
+            if self.compositor.can_blit(canvas, frame, mask):
+                self.compositor.blit(canvas, frame, position, mask=mask, opacity=alpha)
+            else:
+                if mask is not None:
+                    alpha = mask * alpha
+                blit(canvas, frame[..., :3], position, alpha)
+
+        return canvas
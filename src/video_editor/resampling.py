@@ -0,0 +1,316 @@
+import math
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import numpy as np
+
+from .enums import Resampling, ResamplingBackend
+
+__all__ = [
+    "Resampler",
+    "OpenCVResampler",
+    "PillowResampler",
+    "NumpyResampler",
+    "get_resampler",
+]
+
+
+class Resampler(ABC):
+    """
+    Resizes frames to a (width, height) size. `box` is the (left, top,
+    right, bottom) region of the frame to resample, in pixels and possibly
+    fractional, like Pillow's Image.resize(). Frames are uint8 or float
+    arrays of shape (h, w) or (h, w, channels).
+    """
+
+    name = None
+
+    def __init__(self, quality: Resampling = Resampling.BILINEAR) -> None:
+        self.quality = quality
+
+    @property
+    def key(self):
+        return (self.name, self.quality.value)
+
+    @abstractmethod
+    def resample(self, frame: np.ndarray, size, box=None) -> np.ndarray:
+        pass
+
+    def zoom(self, frame: np.ndarray, size, magnification: float) -> np.ndarray:
+        """
+        Resamples the centre of the frame, magnified `magnification` times
+        relative to fitting the whole frame into `size`.
+        """
+        src_h, src_w = frame.shape[:2]
+        box_w = src_w / magnification
+        box_h = src_h / magnification
+        left = (src_w - box_w) / 2
+        top = (src_h - box_h) / 2
+        return self.resample(frame, size, box=(left, top, left + box_w, top + box_h))
+
+
+def get_full_box(frame):
+    return (0, 0, frame.shape[1], frame.shape[0])
+
+
+def lanczos(x):
+    return np.where(np.abs(x) < 3, np.sinc(x) * np.sinc(x / 3), 0)
+
+
+def box_filter(x):
+    return ((x >= -0.5) & (x < 0.5)).astype(np.float32)
+
+
+def get_taps(size, src_size, start, length, quality: Resampling):
+    """
+    Source indices and weights of each output pixel along one axis, as
+    arrays of shape (size, taps).
+    """
+    scale = length / size
+    centers = start + (np.arange(size, dtype=np.float64) + 0.5) * scale
+
+    match quality:
+        case Resampling.NEAREST:
+            indices = np.clip(np.floor(centers), 0, src_size - 1).astype(np.intp)
+            return indices[:, None], np.ones((size, 1), dtype=np.float32)
+        case Resampling.BILINEAR:
+            coords = np.clip(centers - 0.5, 0, src_size - 1)
+            index0 = np.floor(coords).astype(np.intp)
+            index1 = np.minimum(index0 + 1, src_size - 1)
+            weights = (coords - index0).astype(np.float32)
+            return np.stack([index0, index1], axis=1), np.stack(
+                [1 - weights, weights], axis=1
+            )
+
+    # Area and Lanczos are widened when downscaling, so every source pixel
+    # contributes, as in Pillow.
+    kernel, support = (box_filter, 0.5) if quality == Resampling.AREA else (lanczos, 3)
+    filter_scale = max(scale, 1)
+    support *= filter_scale
+    num_taps = math.ceil(2 * support) + 1
+
+    first = np.floor(centers - support).astype(np.intp)
+    indices = first[:, None] + np.arange(num_taps)
+    weights = kernel((indices + 0.5 - centers[:, None]) / filter_scale)
+    weights[(indices < 0) | (indices >= src_size)] = 0
+    weights /= np.maximum(weights.sum(axis=1, keepdims=True), 1e-8)
+    return np.clip(indices, 0, src_size - 1), weights.astype(np.float32)
+
+
+class NumpyResampler(Resampler):
+    """
+    Separable resampling in NumPy, only reading the region of the frame
+    the output depends on.
+    """
+
+    name = ResamplingBackend.NUMPY.value
+
+    def resample(self, frame: np.ndarray, size, box=None) -> np.ndarray:
+        w, h = size
+        src_h, src_w = frame.shape[:2]
+        left, top, right, bottom = box or get_full_box(frame)
+        x_indices, x_weights = get_taps(w, src_w, left, right - left, self.quality)
+        y_indices, y_weights = get_taps(h, src_h, top, bottom - top, self.quality)
+
+        window_left = x_indices.min()
+        window = frame[:, window_left : x_indices.max() + 1]
+        x_indices = x_indices - window_left
+
+        if self.quality == Resampling.NEAREST:
+            return window[y_indices[:, 0]][:, x_indices[:, 0]]
+
+        extra_dims = (1,) * (frame.ndim - 2)
+        rows = 0
+        for i in range(y_indices.shape[1]):
+            weights = y_weights[:, i].reshape((-1, 1) + extra_dims)
+            rows = rows + window[y_indices[:, i]].astype(np.float32) * weights
+
+        sampled = 0
+        for i in range(x_indices.shape[1]):
+            weights = x_weights[:, i].reshape((1, -1) + extra_dims)
+            sampled = sampled + rows[:, x_indices[:, i]] * weights
+
+        if np.issubdtype(frame.dtype, np.integer):
+            sampled += 0.5
+            if self.quality == Resampling.LANCZOS:
+                info = np.iinfo(frame.dtype)
+                np.clip(sampled, info.min, info.max, out=sampled)
+        return sampled.astype(frame.dtype)
+
+
+class OpenCVResampler(Resampler):
+    """
+    Resamples with cv2.resize(), or cv2.warpAffine() for a region of the
+    frame. Area and Lanczos downscaling first reduce the frame with
+    INTER_AREA, which warpAffine() doesn't support and without which
+    INTER_LANCZOS4 aliases.
+    """
+
+    name = ResamplingBackend.OPENCV.value
+    dtypes = (np.uint8, np.uint16, np.float32, np.float64)
+
+    def __init__(self, quality: Resampling = Resampling.BILINEAR) -> None:
+        try:
+            import cv2
+        except ImportError as e:
+            raise ImportError(
+                "OpenCVResampler requires OpenCV, install it with "
+                "`pip install opencv-python-headless`."
+            ) from e
+
+        super().__init__(quality)
+        self._cv2 = cv2
+        self.interpolation = {
+            # Samples at pixel centres like the other backends.
+            Resampling.NEAREST: getattr(cv2, "INTER_NEAREST_EXACT", cv2.INTER_NEAREST),
+            Resampling.BILINEAR: cv2.INTER_LINEAR,
+            Resampling.AREA: cv2.INTER_AREA,
+            Resampling.LANCZOS: cv2.INTER_LANCZOS4,
+        }[quality]
+        self.fallback = NumpyResampler(quality)
+
+    def is_supported(self, frame: np.ndarray) -> bool:
+        return frame.dtype in self.dtypes and (frame.ndim == 2 or frame.shape[2] <= 4)
+
+    def reduce(self, frame, size, box):
+        # Reduces the frame with INTER_AREA, down to the output resolution
+        # for area resampling or twice that for Lanczos.
+        if self.quality not in (Resampling.AREA, Resampling.LANCZOS):
+            return frame, box
+
+        left, top, right, bottom = box
+        factor = 1 if self.quality == Resampling.AREA else 2
+        scale_x = (right - left) / size[0] / factor
+        scale_y = (bottom - top) / size[1] / factor
+        if scale_x <= 1 and scale_y <= 1:
+            return frame, box
+
+        src_h, src_w = frame.shape[:2]
+        x0, y0 = max(0, math.floor(left)), max(0, math.floor(top))
+        x1, y1 = min(src_w, math.ceil(right)), min(src_h, math.ceil(bottom))
+        scale_x, scale_y = max(scale_x, 1), max(scale_y, 1)
+        reduced_size = (
+            max(1, round((x1 - x0) / scale_x)),
+            max(1, round((y1 - y0) / scale_y)),
+        )
+        reduced = self._cv2.resize(
+            frame[y0:y1, x0:x1], reduced_size, interpolation=self._cv2.INTER_AREA
+        )
+        fx = reduced_size[0] / (x1 - x0)
+        fy = reduced_size[1] / (y1 - y0)
+        return reduced, (
+            (left - x0) * fx,
+            (top - y0) * fy,
+            (right - x0) * fx,
+            (bottom - y0) * fy,
+        )
+
+    def resample(self, frame: np.ndarray, size, box=None) -> np.ndarray:
+        if not self.is_supported(frame):
+            return self.fallback.resample(frame, size, box=box)
+
+        cv2 = self._cv2
+        size = tuple(size)
+        box = box or get_full_box(frame)
+        if tuple(box) == get_full_box(frame):
+            if self.quality == Resampling.LANCZOS:
+                frame, box = self.reduce(frame, size, box)
+            return cv2.resize(frame, size, interpolation=self.interpolation)
+
+        frame, (left, top, right, bottom) = self.reduce(frame, size, box)
+        scale_x = (right - left) / size[0]
+        scale_y = (bottom - top) / size[1]
+        # Maps output pixel centres back to the source.
+        matrix = np.array(
+            [
+                [scale_x, 0, left + 0.5 * scale_x - 0.5],
+                [0, scale_y, top + 0.5 * scale_y - 0.5],
+            ],
+            dtype=np.float64,
+        )
+        interpolation = {
+            Resampling.NEAREST: cv2.INTER_NEAREST,
+            Resampling.AREA: cv2.INTER_LINEAR,
+        }.get(self.quality, self.interpolation)
+        return cv2.warpAffine(
+            frame,
+            matrix,
+            size,
+            flags=interpolation | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_REPLICATE,
+        )
+
+
+class PillowResampler(Resampler):
+    """
+    Resamples with Image.resize(), which benefits from Pillow-SIMD when it
+    is installed in place of Pillow. Downscaling widens the filters like
+    the NumPy backend, also for bilinear resampling.
+    """
+
+    name = ResamplingBackend.PILLOW.value
+
+    def __init__(self, quality: Resampling = Resampling.BILINEAR) -> None:
+        try:
+            from PIL import Image
+        except ImportError as e:
+            raise ImportError(
+                "PillowResampler requires Pillow, install it with "
+                "`pip install pillow`."
+            ) from e
+
+        super().__init__(quality)
+        self._image = Image
+        self.filter = {
+            Resampling.NEAREST: Image.Resampling.NEAREST,
+            Resampling.BILINEAR: Image.Resampling.BILINEAR,
+            Resampling.AREA: Image.Resampling.BOX,
+            Resampling.LANCZOS: Image.Resampling.LANCZOS,
+        }[quality]
+        self.fallback = NumpyResampler(quality)
+
+    def is_supported(self, frame: np.ndarray) -> bool:
+        if frame.ndim == 2:
+            return frame.dtype == np.uint8 or np.issubdtype(frame.dtype, np.floating)
+        return frame.dtype == np.uint8 and frame.shape[2] in (3, 4)
+
+    def resample(self, frame: np.ndarray, size, box=None) -> np.ndarray:
+        if not self.is_supported(frame):
+            return self.fallback.resample(frame, size, box=box)
+
+        src_h, src_w = frame.shape[:2]
+        left, top, right, bottom = box or get_full_box(frame)
+        # Pillow rejects regions outside of the image.
+        box = (max(0, left), max(0, top), min(src_w, right), min(src_h, bottom))
+
+        is_float = frame.dtype != np.uint8
+        image = self._image.fromarray(frame.astype(np.float32) if is_float else frame)
+        reducing_gap = 3.0 if self.quality == Resampling.LANCZOS else None
+        resized = np.asarray(
+            image.resize(tuple(size), self.filter, box=box, reducing_gap=reducing_gap)
+        )
+        return resized.astype(frame.dtype) if is_float else resized
+
+
+@lru_cache(maxsize=None)
+def get_resampler(
+    backend: ResamplingBackend = None, quality: Resampling = Resampling.BILINEAR
+) -> Resampler:
+    """
+    Without a backend, OpenCV is used when installed, then Pillow, then
+    NumPy.
+    """
+    if backend is None:
+        for resampler_class in (OpenCVResampler, PillowResampler):
+            try:
+                return resampler_class(quality)
+            except ImportError:
+                pass
+        return NumpyResampler(quality)
+
+    match backend:
+        case ResamplingBackend.OPENCV:
+            return OpenCVResampler(quality)
+        case ResamplingBackend.PILLOW:
+            return PillowResampler(quality)
+        case ResamplingBackend.NUMPY:
+            return NumpyResampler(quality)
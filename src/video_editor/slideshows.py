@@ -0,0 +1,368 @@
+import os
+import math
+import logging
+from dataclasses import dataclass, field
+from typing import List, Tuple
+import numpy as np
+from PIL import Image
+
+from .burn_in import BurnIn
+from .enums import Animation
+from .instrumentation import timer
+from .output_profiles import OutputProfile, get_output_profile
+from .render_plan import RenderPlanClip
+from .static_frames import StaticAwareCompositeVideoClip, is_static
+from .video_animations import get_fades
+from .video_writers import get_temp_dir, num_cores, open_audio_input, run_ffmpeg
+
+__all__ = ["Slideshow", "get_slideshow", "write_slideshow"]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StillLayer:
+    """
+    Full-frame still image shown from `start` to `end`, fading in from and
+    out to what is below it over `fade_in` and `fade_out` seconds.
+    """
+
+    clip: object
+    start: float
+    end: float
+    fade_in: float = 0
+    fade_out: float = 0
+
+    def is_fading(self, start, end) -> bool:
+        return bool(
+            (self.fade_in and start < self.start + self.fade_in)
+            or (self.fade_out and end > self.end - self.fade_out)
+        )
+
+
+@dataclass
+class Shot:
+    """
+    Time span showing a single still layer, or black without one.
+    """
+
+    layer: StillLayer
+    start: float
+    end: float
+
+
+@dataclass
+class Slideshow:
+    """
+    Timeline of still images with cuts and fades through black, which
+    ffmpeg can render without frames being generated in Python.
+    """
+
+    size: Tuple[int, int]
+    duration: float
+    shots: List[Shot] = field(default_factory=list)
+    audio: object = None
+
+
+def is_full_frame(clip, size) -> bool:
+    return (
+        tuple(clip.size) == tuple(size)
+        and not clip.relative_pos
+        and tuple(clip.pos(0)) == (0, 0)
+    )
+
+
+def get_plan_layers(clip: RenderPlanClip):
+    plan = clip.plan
+    layers = []
+    for layer in plan.layers:
+        source = clip.clips[layer.source]
+        if (
+            layer.animation != Animation.NONE
+            or layer.still is not None
+            or layer.slide is not None
+            or source.mask is not None
+            or not is_static(source)
+            or not is_full_frame(source, plan.size)
+            # Plans fade by the nearest edge, the fade filters multiply.
+            or layer.fade_in + layer.fade_out > layer.end - layer.start
+        ):
+            return None
+        layers.append(
+            StillLayer(source, layer.start, layer.end, layer.fade_in, layer.fade_out)
+        )
+    return layers
+
+
+def get_nested_layers(clip):
+    # Slideshows nested in a composite, e.g. a flattened timeline passed to
+    # merge_video_clips().
+    layers = get_still_layers(clip) if clip.mask is None else None
+    if layers is None:
+        return None
+
+    nested_layers = []
+    for layer in layers:
+        start, end = clip.start + layer.start, clip.start + layer.end
+        if end > clip.end:
+            return None
+        nested_layers.append(
+            StillLayer(layer.clip, start, end, layer.fade_in, layer.fade_out)
+        )
+    return nested_layers
+
+
+def get_composite_layers(clip: StaticAwareCompositeVideoClip):
+    if not clip.created_bg or any(clip.bg_color):
+        return None
+
+    layers = []
+    for layer in clip.clips:
+        if layer.end is None or not is_full_frame(layer, clip.size):
+            return None
+
+        if not is_static(layer):
+            nested_layers = get_nested_layers(layer)
+            if nested_layers is None:
+                return None
+            layers += nested_layers
+            continue
+
+        fades = (0, 0) if layer.mask is None else get_fades(layer.mask)
+        if fades is None:
+            return None
+        layers.append(StillLayer(layer, layer.start, layer.end, *fades))
+    return layers
+
+
+def get_still_layers(clip):
+    # The type alone isn't enough: fl() and its derivatives copy the clip
+    # with a new frame function.
+    render_func = getattr(clip.make_frame, "__func__", None)
+    if render_func is RenderPlanClip.render_frame:
+        return get_plan_layers(clip)
+    if (
+        render_func is StaticAwareCompositeVideoClip.make_static_aware_frame
+        and not clip.ismask
+    ):
+        return get_composite_layers(clip)
+    return None
+
+
+def get_shots(layers: List[StillLayer], duration: float) -> List[Shot]:
+    times = {0, duration}
+    times.update(
+        time
+        for layer in layers
+        for time in (layer.start, layer.end)
+        if 0 < time < duration
+    )
+    times = sorted(times)
+
+    shots = []
+    for start, end in zip(times, times[1:]):
+        playing = [
+            layer for layer in layers if layer.start <= start and end <= layer.end
+        ]
+        top = playing[-1] if playing else None
+        # A fading layer is only blended with black by the fade filter.
+        if top is not None and len(playing) > 1 and top.is_fading(start, end):
+            return None
+
+        if shots and shots[-1].layer is top:
+            shots[-1].end = end
+        else:
+            shots.append(Shot(top, start, end))
+    return shots
+
+
+def get_slideshow(clip) -> Slideshow:
+    """
+    Recognises clips that only show full-frame still images with cuts and
+    fades through black: composites of image clips, as merge_video_clips()
+    builds from get_image_clips() or from AutoVideoClipsAnimator with fade
+    transitions and no animation, and flattened render plans of the same.
+    Returns None for anything else.
+    """
+    if clip.duration is None:
+        return None
+
+    layers = get_still_layers(clip)
+    if not layers:
+        return None
+
+    shots = get_shots(layers, clip.duration)
+    if not shots:
+        return None
+    return Slideshow(
+        size=tuple(clip.size), duration=clip.duration, shots=shots, audio=clip.audio
+    )
+
+
+def get_frame_index(t, fps) -> int:
+    # First frame showing time t, frame i shows i / fps.
+    return max(0, math.ceil(t * fps - 1e-6))
+
+
+def get_fade_filter(
+    direction: str, start: float, duration: float, first: int, last: int
+) -> str:
+    # Timed fades darken frame i by the same ramp the Python compositing
+    # applies at i / fps, enabled only over the frames of one shot since
+    # faded out frames would stay black.
+    return (
+        f"fade=t={direction}:st={start:.6f}:d={duration:.6f}"
+        f":enable='between(n,{first},{last - 1})'"
+    )
+
+
+def get_fade_filters(slideshow: Slideshow, fps: float, num_frames: int):
+    filters = []
+    for shot in slideshow.shots:
+        layer = shot.layer
+        if layer is None:
+            continue
+
+        first = get_frame_index(shot.start, fps)
+        last = min(get_frame_index(shot.end, fps), num_frames)
+        if layer.fade_in:
+            fade_end = min(last, get_frame_index(layer.start + layer.fade_in, fps))
+            if first < fade_end:
+                filters.append(
+                    get_fade_filter("in", layer.start, layer.fade_in, first, fade_end)
+                )
+        if layer.fade_out:
+            fade_start = max(first, get_frame_index(layer.end - layer.fade_out, fps))
+            if fade_start < last:
+                filters.append(
+                    get_fade_filter(
+                        "out",
+                        layer.end - layer.fade_out,
+                        layer.fade_out,
+                        fade_start,
+                        last,
+                    )
+                )
+    return filters
+
+
+def to_microseconds(t) -> int:
+    return round(t * 1000000)
+
+
+def write_stills(slideshow: Slideshow, tmp_dir: str) -> List[str]:
+    paths = {}
+    shot_paths = []
+    for shot in slideshow.shots:
+        clip = shot.layer.clip if shot.layer else None
+        key = id(clip)
+        if key not in paths:
+            if clip is None:
+                frame = np.zeros((slideshow.size[1], slideshow.size[0], 3), np.uint8)
+            else:
+                frame = clip.get_frame(0)[:, :, :3].astype(np.uint8)
+            # PPM is uncompressed, writing it is about as fast as a copy.
+            paths[key] = os.path.join(tmp_dir, f"still_{len(paths):05d}.ppm")
+            with timer("slideshow.write_still"):
+                Image.fromarray(frame).save(paths[key])
+        shot_paths.append(paths[key])
+    return shot_paths
+
+
+def escape_path(path: str) -> str:
+    return os.path.abspath(path).replace("'", r"'\''")
+
+
+def write_concat_list(slideshow: Slideshow, shot_paths: List[str], tmp_dir: str):
+    list_path = os.path.join(tmp_dir, "stills.txt")
+    with open(list_path, "w") as f:
+        f.write("ffconcat version 1.0\n")
+        for shot, path in zip(slideshow.shots, shot_paths):
+            escaped_path = escape_path(path)
+            # Durations are rounded so that every shot starts exactly on time.
+            duration = to_microseconds(shot.end) - to_microseconds(shot.start)
+            f.write(f"file '{escaped_path}'\n")
+            # Images are timed in 1 / framerate, 1/25s by default, which
+            # would move the cuts.
+            f.write("option framerate 1000000\n")
+            f.write(f"duration {duration}us\n")
+        # The duration of the last entry is only applied when it is followed
+        # by another one.
+        f.write(f"file '{escape_path(shot_paths[-1])}'\n")
+        f.write("option framerate 1000000\n")
+    return list_path
+
+
+def write_slideshow(
+    slideshow: Slideshow,
+    output_path: str,
+    output_profile: OutputProfile = None,
+    max_duration: float = None,
+    burn_in: BurnIn = None,
+):
+    """
+    Renders the slideshow with a single ffmpeg command. Every distinct
+    still is written once as a PPM image and shown for the duration of its shots
+    through the concat demuxer, then ffmpeg applies the preview scaling,
+    repeats the frames at the output frame rate and darkens the frames of
+    the fades and burns in the `burn_in` overlays. Frame i shows time
+    i / fps, as when frames are rendered in Python.
+    """
+    profile = output_profile or get_output_profile()
+    duration = slideshow.duration
+    if max_duration:
+        duration = min(duration, max_duration)
+    # The last frame starts before the end, as in iter_frames().
+    num_frames = max(1, get_frame_index(duration, profile.fps))
+
+    # Stills are scaled and converted to the encoder's pixel format before
+    # their frames are repeated, rather than once per frame.
+    size = profile.get_output_size(slideshow.size)
+    pixel_format = profile.get_pixel_format(size)
+    filters = []
+    if size != slideshow.size:
+        filters.append(f"scale={size[0]}:{size[1]}:flags=area")
+    if pixel_format:
+        filters.append(f"format={pixel_format}")
+    # Frames are timed in microseconds rather than in 1 / fps, to which
+    # fade rounds its start and duration and -t the end of the output.
+    filters.append(f"fps={profile.fps}:round=up")
+    filters.append("settb=AVTB")
+    filters += get_fade_filters(slideshow, profile.fps, num_frames)
+
+    with get_temp_dir(output_path) as tmp_dir:
+        with timer("slideshow.stills"):
+            shot_paths = write_stills(slideshow, tmp_dir)
+        list_path = write_concat_list(slideshow, shot_paths, tmp_dir)
+
+        # Long fade chains would exceed the maximum argument length.
+        filter_path = os.path.join(tmp_dir, "filters.txt")
+        if burn_in is not None:
+            burn_in.write_filter_script(filter_path, size, profile.fps, filters=filters)
+        else:
+            with open(filter_path, "w") as f:
+                f.write(",\n".join(filters))
+
+        with open_audio_input(slideshow, tmp_dir, profile) as audio:
+            args = ["-f", "concat", "-safe", "0", "-i", list_path]
+            if audio is not None:
+                args += audio.get_args(input_index=1)
+            args += [
+                "-filter_script:v",
+                filter_path,
+                "-frames:v",
+                str(num_frames),
+                "-t",
+                f"{duration:.6f}",
+                *profile.get_video_args(
+                    size=size, threads=profile.threads or num_cores
+                ),
+                output_path,
+            ]
+            logger.info(
+                "Writing %s as a slideshow of %d shots with ffmpeg",
+                output_path,
+                len(slideshow.shots),
+            )
+            with timer("slideshow.encode"):
+                run_ffmpeg(args)
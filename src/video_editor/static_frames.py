@@ -0,0 +1,168 @@
+import numpy as np
+from moviepy.video.VideoClip import ImageClip
+from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+
+from .compositing import get_compositor
+from .instrumentation import count, timer
+
+__all__ = [
+    "StaticAwareCompositeVideoClip",
+    "is_static",
+    "mark_static",
+    "set_frame_key_func",
+]
+
+
+def get_static_frame_codes():
+    # ImageClip and its fl_image() store the image in a constant frame
+    # function; recognising their code objects tells static clips apart
+    # from clips transformed per frame with fl().
+    clip = ImageClip(np.zeros((1, 1, 3), dtype=np.uint8))
+    return {
+        clip.make_frame.__code__,
+        clip.fl_image(lambda frame: frame).make_frame.__code__,
+    }
+
+
+_static_frame_codes = get_static_frame_codes()
+
+
+def mark_static(clip):
+    """
+    Declares that the clip returns the same frame at any time. The mark is
+    tied to the clip's current frame function, so clips derived with fl()
+    are not considered static.
+    """
+    clip.static_frame = clip.make_frame
+    return clip
+
+
+def set_frame_key_func(clip, frame_key_func):
+    """
+    Lets a clip transformed with fl() describe when its frames change, e.g.
+    a fade that is static again once it has finished. Like mark_static(),
+    it is tied to the clip's current frame function.
+    """
+    clip.frame_key_func = (clip.make_frame, frame_key_func)
+    return clip
+
+
+def is_static(clip) -> bool:
+    make_frame = clip.make_frame
+    return (
+        getattr(clip, "static_frame", None) is make_frame
+        or getattr(make_frame, "__code__", None) in _static_frame_codes
+    )
+
+
+def get_frame_key(clip, t):
+    """
+    Returns a value that only changes when the clip's frame at `t` may
+    differ from its previous frame, or None when that is unknown.
+    """
+    if is_static(clip):
+        return clip.make_frame
+
+    frame_key_func = getattr(clip, "frame_key_func", None)
+    if frame_key_func is not None and frame_key_func[0] is clip.make_frame:
+        return frame_key_func[1](t)
+
+    composite = getattr(clip.make_frame, "__self__", None)
+    if isinstance(composite, StaticAwareCompositeVideoClip):
+        return composite.get_frame_key(t)
+
+    return None
+
+
+def get_layer_key(clip, t):
+    clip_time = t - clip.start
+
+    frame_key = get_frame_key(clip, clip_time)
+    if frame_key is None:
+        return None
+
+    mask_key = None
+    if clip.mask is not None:
+        mask_key = get_frame_key(clip.mask, clip_time)
+        if mask_key is None:
+            return None
+
+    position = clip.pos(clip_time)
+    if not isinstance(position, str):
+        position = tuple(position)
+
+    return frame_key, mask_key, position, clip.relative_pos
+
+
+class StaticAwareCompositeVideoClip(CompositeVideoClip):
+    """
+    CompositeVideoClip that reuses its previous frame while every playing
+    layer is static and in the same place, e.g. still images with no
+    animation, instead of compositing the same frame again. Layers that
+    only move are still blitted as shifted views of their cached images.
+
+    RGB frames are composited in uint8 by the Compositor, into a new frame
+    each time since frames are kept as the previous frame and queued by
+    the pipelined writer. Mask composites blend floats like moviepy.
+    """
+
+    def __init__(
+        self, clips, size=None, bg_color=None, use_bgclip=False, ismask=False
+    ) -> None:
+        super().__init__(
+            clips,
+            size=size,
+            bg_color=bg_color,
+            use_bgclip=use_bgclip,
+            ismask=ismask,
+        )
+
+        if type(self.mask) is CompositeVideoClip:
+            self.mask = StaticAwareCompositeVideoClip(
+                self.mask.clips, self.size, ismask=True, bg_color=0.0
+            )
+
+        if not ismask:
+            self.compositor = get_compositor()
+            self.composite_frame = self.composite_layers
+        else:
+            self.composite_frame = self.make_frame
+        self.last_frame = (None, None)
+        self.make_frame = self.make_static_aware_frame
+
+    def get_frame_key(self, t):
+        bg_key = get_frame_key(self.bg, t)
+        if bg_key is None:
+            return None
+
+        keys = [bg_key]
+        for clip in self.playing_clips(t):
+            key = get_layer_key(clip, t)
+            if key is None:
+                return None
+            keys.append(key)
+
+        return tuple(keys)
+
+    def composite_layers(self, t):
+        background = self.bg.get_frame(t)
+        frame = np.empty(background.shape, dtype=np.uint8)
+        np.copyto(frame, background, casting="unsafe")
+        for clip in self.playing_clips(t):
+            frame = self.compositor.blit_clip(frame, clip, t)
+        return frame
+
+    def make_static_aware_frame(self, t):
+        key = self.get_frame_key(t)
+        if key is not None:
+            last_key, last_frame = self.last_frame
+            if last_key == key:
+                count("cache.composite_frames.hits")
+                return last_frame
+
+        count("cache.composite_frames.misses")
+        with timer("frame.composite"):
+            frame = self.composite_frame(t)
+        if key is not None:
+            self.last_frame = (key, frame)
+        return frame
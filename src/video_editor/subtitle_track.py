@@ -0,0 +1,62 @@
+from typing import List
+import numpy as np
+from moviepy.video.VideoClip import VideoClip
+
+from .compositing import get_compositor
+from .instrumentation import timer
+
+__all__ = ["SubtitleTrack"]
+
+
+class SubtitleTrack:
+    """
+    Time index over subtitle clips, so each frame only blits the words that
+    are visible at that time instead of walking every word layer. The
+    frame is copied once and the words are blended into the copy.
+    """
+
+    def __init__(self, clips: List[VideoClip]) -> None:
+        order = sorted(range(len(clips)), key=lambda i: clips[i].start)
+
+        self.clips = [clips[i] for i in order]
+        self.layers = np.array(order, dtype=np.intp)
+        self.starts = np.array([clip.start for clip in self.clips], dtype=float)
+        self.ends = np.array(
+            [np.inf if clip.end is None else clip.end for clip in self.clips],
+            dtype=float,
+        )
+        # Running maximum of the end times, sorted by construction, tells
+        # which clips may still be playing at any given time.
+        self.max_ends = np.maximum.accumulate(self.ends)
+        self.compositor = get_compositor()
+
+    @property
+    def end(self):
+        return float(self.ends.max()) if len(self.clips) else 0
+
+    def get_active_clips(self, t: float) -> List[VideoClip]:
+        first = np.searchsorted(self.max_ends, t, side="right")
+        last = np.searchsorted(self.starts, t, side="right")
+
+        active = first + np.flatnonzero(self.ends[first:last] > t)
+        active = active[np.argsort(self.layers[active], kind="stable")]
+        return [self.clips[i] for i in active]
+
+    def blit_on(self, frame: np.ndarray, t: float) -> np.ndarray:
+        with timer("frame.subtitles"):
+            clips = self.get_active_clips(t)
+            if not clips:
+                return frame
+
+            # The frame may be cached upstream, e.g. as the previous frame
+            # of a StaticAwareCompositeVideoClip.
+            frame = frame.astype(np.uint8)
+            for clip in clips:
+                frame = self.compositor.blit_clip(frame, clip, t)
+            return frame
+
+    def apply_to(self, clip: VideoClip) -> VideoClip:
+        final_clip = clip.fl(lambda get_frame, t: self.blit_on(get_frame(t), t))
+        if clip.duration is not None and self.end > clip.duration:
+            final_clip = final_clip.set_duration(self.end)
+        return final_clip
@@ -1,4 +1,5 @@
-from moviepy.editor import TextClip
+from moviepy.video.VideoClip import TextClip
+from moviepy.video.compositing.transitions import crossfadein
 
 from .enums import TextAnimation
 
@@ -15,7 +16,7 @@ def animate_text_clip(
 ):
     match animation:
         case TextAnimation.SLIDE_UP_FADE_IN:
-            clip = slide_up_fade_in(
+            return slide_up_fade_in(
                 clip=clip,
                 x_position=x_position,
                 y_position=y_position,
@@ -23,7 +24,7 @@ def animate_text_clip(
                 animation_duration=animation_duration,
             )
         case TextAnimation.NONE:
-            set_relative_position(
+            return set_relative_position(
                 clip=clip,
                 x_position=x_position,
                 y_position=y_position,
@@ -51,4 +52,4 @@ def slide_up_fade_in(
             y_position + move_distance * (1 - min(t / animation_duration, 1)),
         ),
         relative=True,
-    ).crossfadein(animation_duration)
+    ).fx(crossfadein, animation_duration)
@@ -0,0 +1,120 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from .instrumentation import count
+
+__all__ = ["WordRasterCache", "get_default_word_cache"]
+
+
+class WordRasterCache:
+    """
+    LRU cache of rendered words, holding the RGB raster and the mask of each
+    word within a memory budget and optionally persisting them to disk so
+    they can be reused across jobs.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, cache_dir: str = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count("cache.words.hits")
+                return entry
+
+        entry = self._load(key)
+        if entry is None:
+            self.misses += 1
+            count("cache.words.misses")
+            return None
+
+        self.hits += 1
+        count("cache.words.hits")
+        self._store(key, *entry)
+        return entry
+
+    def put(self, key: tuple, rgb: np.ndarray, mask: np.ndarray):
+        entry = self._store(key, rgb, mask)
+        self._save(key, *entry)
+        return entry
+
+    def get_or_render(self, key: tuple, render):
+        entry = self.get(key)
+        if entry is None:
+            entry = self.put(key, *render())
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.num_bytes = 0
+
+    def _store(self, key, rgb, mask):
+        rgb.setflags(write=False)
+        mask.setflags(write=False)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            self._entries[key] = (rgb, mask)
+            self.num_bytes += rgb.nbytes + mask.nbytes
+
+            while self.num_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (old_rgb, old_mask) = self._entries.popitem(last=False)
+                self.num_bytes -= old_rgb.nbytes + old_mask.nbytes
+
+        return rgb, mask
+
+    def _get_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.npz")
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+
+        path = self._get_path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with np.load(path) as data:
+                return data["rgb"], data["mask"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key, rgb, mask):
+        if not self.cache_dir:
+            return
+
+        path = self._get_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, rgb=rgb, mask=mask)
+        os.replace(tmp_path, path)
+
+
+_default_word_cache = None
+
+
+def get_default_word_cache() -> WordRasterCache:
+    global _default_word_cache
+    if _default_word_cache is None:
+        _default_word_cache = WordRasterCache()
+    return _default_word_cache
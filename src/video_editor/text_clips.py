@@ -1,8 +1,12 @@
 import re
-from moviepy.editor import TextClip
-from .enums import TextAnimation
+import numpy as np
+from moviepy.video.VideoClip import ImageClip, VideoClip
+from .enums import SubtitleLayout, TextAnimation
+from .instrumentation import timer
+from .static_frames import set_frame_key_func
 from .text_animations import animate_text_clip
-
+from .text_cache import WordRasterCache, get_default_word_cache
+from .text_renderers import TextRenderer, get_text_renderer
 
 __all__ = ["get_subtitle_clips"]
 
@@ -22,10 +26,36 @@ def get_subtitle_clips(
     animation_duration: float = 0.05,
     move_distance: float = 0.05,
     animation: TextAnimation = TextAnimation.NONE,
+    word_cache: WordRasterCache = None,
+    text_renderer: TextRenderer = None,
+    layout: SubtitleLayout = SubtitleLayout.WORDS,
 ):
+    """
+    With the WORDS layout, every word is its own clip, animated on its
+    own. The LINES layout rasterizes each line once into a single clip,
+    which shows each word's span of the raster while the word is spoken
+    and is animated once per line.
+    """
+    if word_cache is None:
+        word_cache = get_default_word_cache()
+
+    if text_renderer is None:
+        text_renderer = get_text_renderer()
+
+    match layout:
+        case SubtitleLayout.WORDS:
+            get_line_clips = get_subtitle_line_clips
+        case SubtitleLayout.LINES:
+
+            def get_line_clips(**kwargs):
+                # Lines without words show nothing, as with WORDS.
+                if not kwargs["subtitle_line"]["words"]:
+                    return []
+                return [get_subtitle_line_clip(**kwargs)]
+
     subtitle_clips = []
     for subtitle_line in subtitles:
-        subtitle_clips += get_subtitle_line_clips(
+        subtitle_clips += get_line_clips(
             subtitle_line=subtitle_line,
             screen_width=screen_width,
             font_path=font_path,
@@ -40,6 +70,8 @@ def get_subtitle_clips(
             animation_duration=animation_duration,
             move_distance=move_distance,
             animation=animation,
+            word_cache=word_cache,
+            text_renderer=text_renderer,
         )
     return subtitle_clips
 
@@ -59,43 +91,45 @@ def get_subtitle_line_clips(
     animation_duration: float = 0.05,
     move_distance: float = 0.05,
     animation: TextAnimation = TextAnimation.NONE,
+    word_cache: WordRasterCache = None,
+    text_renderer: TextRenderer = None,
 ):
-    def get_text_width(text: str):
-        clip = TextClip(
-            txt=format_word(text),
-            fontsize=font_size,
-            font=font_path,
-            color=color,
-            stroke_color=stroke_color,
-            stroke_width=stroke_width,
-            kerning=kerning,
-        )
-        return clip.size[0]
+    if word_cache is None:
+        word_cache = get_default_word_cache()
+
+    if text_renderer is None:
+        text_renderer = get_text_renderer()
 
-    def get_start_x_position():
-        total_width = 0
-        for word in subtitle_line["words"]:
-            text_width = get_text_width(text=word["word"])
-            total_width += text_width + spacing
-        total_width -= spacing
-        start_x_position = (screen_width - total_width) / 2
-        return start_x_position
+    style = dict(
+        font_path=font_path,
+        font_size=font_size,
+        color=color,
+        stroke_color=stroke_color,
+        stroke_width=stroke_width,
+        kerning=kerning,
+    )
 
-    current_x_position = get_start_x_position()
-    x_position = current_x_position / screen_width
+    x_positions = get_word_x_positions(
+        subtitle_line=subtitle_line,
+        screen_width=screen_width,
+        spacing=spacing,
+        word_cache=word_cache,
+        text_renderer=text_renderer,
+        **style,
+    )
 
     clips = []
-    for word in subtitle_line["words"]:
+    for word, current_x_position in zip(subtitle_line["words"], x_positions):
+        x_position = current_x_position / screen_width
+        rgb, mask = render_word(
+            text=format_word(word["word"]),
+            word_cache=word_cache,
+            text_renderer=text_renderer,
+            **style,
+        )
         clip = (
-            TextClip(
-                txt=format_word(word["word"]),
-                fontsize=font_size,
-                font=font_path,
-                color=color,
-                stroke_color=stroke_color,
-                stroke_width=stroke_width,
-                kerning=kerning,
-            )
+            ImageClip(rgb)
+            .set_mask(ImageClip(mask, ismask=True))
             .set_start(word["start"] + offset_time)
             .set_duration(word["end"] - word["start"])
         )
@@ -111,12 +145,260 @@ def get_subtitle_line_clips(
 
         clips.append(clip)
 
-        text_width = get_text_width(text=word["word"])
-        current_x_position += text_width + spacing
-        x_position = current_x_position / screen_width
-
     return clips
 
 
+def get_subtitle_line_clip(
+    subtitle_line: list,
+    screen_width: int,
+    font_path: str,
+    font_size: int,
+    color: str = "white",
+    stroke_color: str = "black",
+    stroke_width: int = 3,
+    kerning: int = -1,
+    spacing: int = 0,
+    offset_time: float = 0,
+    y_position: float = 0.45,
+    animation_duration: float = 0.05,
+    move_distance: float = 0.05,
+    animation: TextAnimation = TextAnimation.NONE,
+    word_cache: WordRasterCache = None,
+    text_renderer: TextRenderer = None,
+):
+    """
+    Lays the line out like get_subtitle_line_clips() and rasterizes it into
+    one clip. Its mask shows the pixel span of each word from the word's
+    start to its end, and its `word_spans` lists the (left, right, start,
+    end) of each word relative to the clip.
+    """
+    if word_cache is None:
+        word_cache = get_default_word_cache()
+
+    if text_renderer is None:
+        text_renderer = get_text_renderer()
+
+    style = dict(
+        font_path=font_path,
+        font_size=font_size,
+        color=color,
+        stroke_color=stroke_color,
+        stroke_width=stroke_width,
+        kerning=kerning,
+    )
+
+    words = subtitle_line["words"]
+    x_positions = get_word_x_positions(
+        subtitle_line=subtitle_line,
+        screen_width=screen_width,
+        spacing=spacing,
+        word_cache=word_cache,
+        text_renderer=text_renderer,
+        **style,
+    )
+    rasters = [
+        render_word(
+            text=format_word(word["word"]),
+            word_cache=word_cache,
+            text_renderer=text_renderer,
+            **style,
+        )
+        for word in words
+    ]
+
+    line_start = min(word["start"] for word in words)
+    line_end = max(word["end"] for word in words)
+    offsets = [round(x - x_positions[0]) for x in x_positions]
+
+    with timer("text.layout_line"):
+        rgb, mask = draw_line(rasters, offsets)
+
+    word_spans = [
+        (
+            offset,
+            offset + word_rgb.shape[1],
+            word["start"] - line_start,
+            word["end"] - line_start,
+        )
+        for word, offset, (word_rgb, _) in zip(words, offsets, rasters)
+    ]
+
+    # The reveal mask is the same array while the same words are shown, so
+    # the compositor only blends the columns of the visible words.
+    clip = (
+        ImageClip(rgb)
+        .set_mask(get_reveal_mask_clip(mask, word_spans, line_end - line_start))
+        .set_start(line_start + offset_time)
+        .set_duration(line_end - line_start)
+    )
+
+    return animate_text_clip(
+        clip=clip,
+        x_position=x_positions[0] / screen_width,
+        y_position=y_position,
+        move_distance=move_distance,
+        animation_duration=animation_duration,
+        animation=animation,
+    )
+
+
+def draw_line(rasters: list, offsets: list):
+    # Words are drawn over each other in order, as the word clips would be
+    # composited when spacing makes them overlap.
+    width = max(offset + rgb.shape[1] for (rgb, _), offset in zip(rasters, offsets))
+    height = max(rgb.shape[0] for rgb, _ in rasters)
+    rgb = np.zeros((height, width, 3), dtype=np.float32)
+    mask = np.zeros((height, width), dtype=np.float32)
+
+    for (word_rgb, word_mask), offset in zip(rasters, offsets):
+        h, w = word_mask.shape
+        alpha = word_mask.astype(np.float32)
+        region = (slice(0, h), slice(offset, offset + w))
+        rgb[region] = word_rgb * alpha[:, :, None] + rgb[region] * (
+            1 - alpha[:, :, None]
+        )
+        mask[region] = alpha + mask[region] * (1 - alpha)
+
+    # Colours are kept unpremultiplied, so edges blend like the word rasters.
+    covered = mask > 0
+    rgb[covered] /= mask[covered][:, None]
+    return np.clip(rgb + 0.5, 0, 255).astype(np.uint8), mask.astype(np.float64)
+
+
+def get_reveal_mask_clip(mask: np.ndarray, word_spans: list, duration: float):
+    def get_visible_words(t):
+        return tuple(
+            i for i, (_, _, start, end) in enumerate(word_spans) if start <= t < end
+        )
+
+    last_mask = [None, None]
+
+    def make_frame(t):
+        visible_words = get_visible_words(t)
+        if last_mask[0] != visible_words:
+            columns = np.zeros(mask.shape[1], dtype=mask.dtype)
+            for i in visible_words:
+                left, right = word_spans[i][:2]
+                columns[left:right] = 1
+            last_mask[:] = visible_words, mask * columns
+        return last_mask[1]
+
+    mask_clip = VideoClip(make_frame, ismask=True, duration=duration)
+    return set_frame_key_func(mask_clip, get_visible_words)
+
+
+def get_word_x_positions(
+    subtitle_line: list,
+    screen_width: int,
+    spacing: int,
+    font_path: str,
+    font_size: int,
+    color: str,
+    stroke_color: str,
+    stroke_width: int,
+    kerning: int,
+    word_cache: WordRasterCache,
+    text_renderer: TextRenderer,
+) -> list:
+    """
+    Left edge of each word in pixels, with the line centred on the screen.
+    """
+    widths = [
+        measure_word(
+            text=format_word(word["word"]),
+            font_path=font_path,
+            font_size=font_size,
+            color=color,
+            stroke_color=stroke_color,
+            stroke_width=stroke_width,
+            kerning=kerning,
+            word_cache=word_cache,
+            text_renderer=text_renderer,
+        )
+        for word in subtitle_line["words"]
+    ]
+
+    total_width = sum(width + spacing for width in widths) - spacing
+    current_x_position = (screen_width - total_width) / 2
+
+    x_positions = []
+    for width in widths:
+        x_positions.append(current_x_position)
+        current_x_position += width + spacing
+    return x_positions
+
+
+def render_word(
+    text: str,
+    font_path: str,
+    font_size: int,
+    color: str,
+    stroke_color: str,
+    stroke_width: int,
+    kerning: int,
+    word_cache: WordRasterCache,
+    text_renderer: TextRenderer,
+):
+    def render():
+        with timer(f"text.render.{text_renderer.name}"):
+            return text_renderer.render(
+                text=text,
+                font_path=font_path,
+                font_size=font_size,
+                color=color,
+                stroke_color=stroke_color,
+                stroke_width=stroke_width,
+                kerning=kerning,
+            )
+
+    key = (
+        text_renderer.name,
+        text,
+        font_path,
+        font_size,
+        color,
+        stroke_color,
+        stroke_width,
+        kerning,
+    )
+    return word_cache.get_or_render(key, render)
+
+
+def measure_word(
+    text: str,
+    font_path: str,
+    font_size: int,
+    color: str,
+    stroke_color: str,
+    stroke_width: int,
+    kerning: int,
+    word_cache: WordRasterCache,
+    text_renderer: TextRenderer,
+) -> int:
+    if text_renderer.has_metrics:
+        return text_renderer.measure(
+            text=text,
+            font_path=font_path,
+            font_size=font_size,
+            color=color,
+            stroke_color=stroke_color,
+            stroke_width=stroke_width,
+            kerning=kerning,
+        )
+
+    rgb, _ = render_word(
+        text=text,
+        font_path=font_path,
+        font_size=font_size,
+        color=color,
+        stroke_color=stroke_color,
+        stroke_width=stroke_width,
+        kerning=kerning,
+        word_cache=word_cache,
+        text_renderer=text_renderer,
+    )
+    return rgb.shape[1]
+
+
 def format_word(word: str) -> str:
     return re.sub(r"[;,.]", "", word).upper().strip()
@@ -0,0 +1,222 @@
+import math
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import numpy as np
+
+from .enums import TextBackend
+
+__all__ = [
+    "TextRenderer",
+    "ImageMagickTextRenderer",
+    "PillowTextRenderer",
+    "get_text_renderer",
+]
+
+
+class TextRenderer(ABC):
+    """
+    Renders a single line of text into an RGB raster and a mask.
+
+    Renderers that can compute widths from font metrics set `has_metrics`,
+    others are measured by rendering the text.
+    """
+
+    name = None
+    has_metrics = False
+
+    @abstractmethod
+    def render(
+        self,
+        text: str,
+        font_path: str,
+        font_size: int,
+        color: str,
+        stroke_color: str,
+        stroke_width: int,
+        kerning: int,
+    ):
+        pass
+
+    def measure(
+        self,
+        text: str,
+        font_path: str,
+        font_size: int,
+        color: str,
+        stroke_color: str,
+        stroke_width: int,
+        kerning: int,
+    ) -> int:
+        rgb, _ = self.render(
+            text=text,
+            font_path=font_path,
+            font_size=font_size,
+            color=color,
+            stroke_color=stroke_color,
+            stroke_width=stroke_width,
+            kerning=kerning,
+        )
+        return rgb.shape[1]
+
+
+@lru_cache(maxsize=None)
+def configure_imagemagick():
+    # ImageMagick 7 ships a single `magick` binary. Applied on first use
+    # rather than on package import, which only needs it for TextClip.
+    import moviepy.config as cfg
+
+    cfg.change_settings({"IMAGEMAGICK_BINARY": "magick"})
+
+
+class ImageMagickTextRenderer(TextRenderer):
+    name = TextBackend.IMAGEMAGICK.value
+
+    def __init__(self) -> None:
+        configure_imagemagick()
+
+    def render(
+        self,
+        text: str,
+        font_path: str,
+        font_size: int,
+        color: str,
+        stroke_color: str,
+        stroke_width: int,
+        kerning: int,
+    ):
+        from moviepy.video.VideoClip import TextClip
+
+        clip = TextClip(
+            txt=text,
+            fontsize=font_size,
+            font=font_path,
+            color=color,
+            stroke_color=stroke_color,
+            stroke_width=stroke_width,
+            kerning=kerning,
+        )
+        return clip.get_frame(0), clip.mask.get_frame(0)
+
+
+class PillowTextRenderer(TextRenderer):
+    """
+    Renders text in memory with Pillow/FreeType. Kerning is added between
+    characters like ImageMagick's `-kerning`, and the stroke is drawn under
+    the whole text before the fill.
+    """
+
+    name = TextBackend.PILLOW.value
+    has_metrics = True
+
+    def __init__(self) -> None:
+        try:
+            from PIL import Image, ImageDraw, ImageFont
+        except ImportError as e:
+            raise ImportError(
+                "PillowTextRenderer requires Pillow, install it with "
+                "`pip install pillow`."
+            ) from e
+
+        self._image = Image
+        self._image_draw = ImageDraw
+        self.get_font = lru_cache(maxsize=32)(
+            lambda font_path, font_size: ImageFont.truetype(font_path, font_size)
+        )
+
+    def get_layout(
+        self, text, font_path, font_size, stroke_color, stroke_width, kerning
+    ):
+        font = self.get_font(font_path, font_size)
+        padding = stroke_width if stroke_color else 0
+
+        offsets = [font.getlength(text[:i]) + kerning * i for i in range(len(text))]
+        text_width = font.getlength(text) + kerning * max(len(text) - 1, 0)
+        ascent, descent = font.getmetrics()
+
+        width = max(math.ceil(text_width), 1) + 2 * padding
+        height = ascent + descent + 2 * padding
+        return font, offsets, padding, (width, height)
+
+    def measure(
+        self,
+        text: str,
+        font_path: str,
+        font_size: int,
+        color: str,
+        stroke_color: str,
+        stroke_width: int,
+        kerning: int,
+    ) -> int:
+        _, _, _, (width, _) = self.get_layout(
+            text=text,
+            font_path=font_path,
+            font_size=font_size,
+            stroke_color=stroke_color,
+            stroke_width=stroke_width,
+            kerning=kerning,
+        )
+        return width
+
+    def render(
+        self,
+        text: str,
+        font_path: str,
+        font_size: int,
+        color: str,
+        stroke_color: str,
+        stroke_width: int,
+        kerning: int,
+    ):
+        font, offsets, padding, size = self.get_layout(
+            text=text,
+            font_path=font_path,
+            font_size=font_size,
+            stroke_color=stroke_color,
+            stroke_width=stroke_width,
+            kerning=kerning,
+        )
+
+        image = self._image.new("RGBA", size, (0, 0, 0, 0))
+        draw = self._image_draw.Draw(image)
+
+        def draw_text(fill, width):
+            if kerning == 0:
+                draw.text(
+                    (padding, padding),
+                    text,
+                    font=font,
+                    fill=fill,
+                    stroke_width=width,
+                    stroke_fill=fill,
+                )
+                return
+            for offset, char in zip(offsets, text):
+                draw.text(
+                    (padding + offset, padding),
+                    char,
+                    font=font,
+                    fill=fill,
+                    stroke_width=width,
+                    stroke_fill=fill,
+                )
+
+        if padding:
+            draw_text(fill=stroke_color, width=stroke_width)
+        draw_text(fill=color, width=0)
+
+        array = np.asarray(image)
+        return array[:, :, :3].copy(), array[:, :, 3] / 255.0
+
+
+def get_text_renderer(backend: TextBackend = None) -> TextRenderer:
+    if backend is None:
+        try:
+            return PillowTextRenderer()
+        except ImportError:
+            return ImageMagickTextRenderer()
+
+    match backend:
+        case TextBackend.PILLOW:
+            return PillowTextRenderer()
+        case TextBackend.IMAGEMAGICK:
+            return ImageMagickTextRenderer()
@@ -1,5 +1,6 @@
 import os
 import glob
+import hashlib
 
 
 def list_subpaths(dir_path):
@@ -8,3 +9,11 @@ def list_subpaths(dir_path):
 
 def list_file_paths(dir_path):
     return [f for f in list_subpaths(dir_path=dir_path) if os.path.isfile(f)]
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
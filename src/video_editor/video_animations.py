@@ -1,10 +1,19 @@
 import random
-from scipy.ndimage import zoom as nd_zoom
-from moviepy.editor import CompositeVideoClip
-from moviepy.video.fx.all import resize
-from .enums import Direction
+from moviepy.video.compositing import transitions
+from .enums import Animation, Direction, Resampling
+from .frame_extraction import get_first_frame, get_last_frame
+from .image_loading import get_zoom_source
+from .instrumentation import timer
+from .resampling import Resampler, get_resampler
+from .static_frames import (
+    StaticAwareCompositeVideoClip,
+    get_frame_key,
+    is_static,
+    set_frame_key_func,
+)
 
 __all__ = [
+    "animate_clip",
     "crossfadein",
     "crossfadeout",
     "get_first_frame",
@@ -12,153 +21,222 @@ __all__ = [
     "merge_two_clips",
     "slide_in",
     "slide_out",
+    "zoom_clip",
     "zoom_in",
     "zoom_out",
     "zoom_in_out",
 ]
 
 
+def get_fade_key_func(mask, fade_factor):
+    def fade_key(t):
+        mask_key = get_frame_key(mask, t)
+        if mask_key is None:
+            return None
+        return mask_key, fade_factor(t)
+
+    return fade_key
+
+
+def set_fades(mask, fades):
+    """
+    Records the (fade in, fade out) durations of a mask that is otherwise
+    fully opaque, so the fades can be rendered by ffmpeg. Like
+    mark_static(), it is tied to the mask's current frame function.
+    """
+    mask.fades = (mask.make_frame, fades)
+    return mask
+
+
+def get_fades(mask):
+    """
+    Returns the (fade in, fade out) durations of the mask, (0, 0) for an
+    opaque static mask, or None when the mask is anything else.
+    """
+    fades = getattr(mask, "fades", None)
+    if fades is not None and fades[0] is mask.make_frame:
+        return fades[1]
+    if is_static(mask) and (mask.get_frame(0) >= 1).all():
+        return 0, 0
+    return None
+
+
 def crossfadein(clip, duration):
-    return clip.crossfadein(duration)
+    if clip.mask is None:
+        clip = clip.add_mask()
+
+    faded_clip = clip.fx(transitions.crossfadein, duration)
+    set_frame_key_func(
+        faded_clip.mask,
+        get_fade_key_func(clip.mask, lambda t: min(t / duration, 1)),
+    )
+    fades = get_fades(clip.mask)
+    if fades is not None:
+        set_fades(faded_clip.mask, (duration, fades[1]))
+    return faded_clip
 
 
 def crossfadeout(clip, duration):
-    return clip.crossfadeout(duration)
+    if clip.mask is None:
+        clip = clip.add_mask()
+
+    faded_clip = clip.fx(transitions.crossfadeout, duration)
+    set_frame_key_func(
+        faded_clip.mask,
+        get_fade_key_func(
+            clip.mask, lambda t: min((faded_clip.duration - t) / duration, 1)
+        ),
+    )
+    fades = get_fades(clip.mask)
+    if fades is not None:
+        set_fades(faded_clip.mask, (fades[0], duration))
+    return faded_clip
 
 
 def ease_in_out(t, smoothness=4):
     return t**smoothness / (t**smoothness + (1 - t) ** smoothness)
 
 
-def get_crop_func(clip, zoom_func):
-    def crop_func(get_frame, t):
-        frame = get_frame(t)
-        scale, x, y = zoom_func(t)
+def get_zoom_func(clip, scale_func, resampler: Resampler, get_source=None):
+    size = tuple(clip.size)
 
-        resized_frame = nd_zoom(frame, (scale, scale, 1), order=1)
+    def zoom_func(get_frame, t):
+        scale = scale_func(t)
+        frame = get_source() if get_source else get_frame(t)
+        with timer("frame.zoom"):
+            # The previous resize + nd_zoom pipeline applied the scale twice
+            # before cropping, keep that framing.
+            return resampler.zoom(frame, size, scale * scale)
 
-        crop_x1 = int((resized_frame.shape[1] - clip.w) / 2)
-        crop_y1 = int((resized_frame.shape[0] - clip.h) / 2)
-        crop_x2 = crop_x1 + clip.w
-        crop_y2 = crop_y1 + clip.h
+    return zoom_func
 
-        return resized_frame[crop_y1:crop_y2, crop_x1:crop_x2]
 
-    return crop_func
+def zoom_clip(clip, duration, scale_func, resampler: Resampler = None):
+    """
+    Zooms into the centre of the clip, by default resampling bilinearly
+    with the fastest available backend.
+    """
+    if resampler is None:
+        resampler = get_resampler(quality=Resampling.BILINEAR)
 
+    zoom_func = get_zoom_func(
+        clip=clip,
+        scale_func=scale_func,
+        resampler=resampler,
+        get_source=get_zoom_source(clip),
+    )
+    zoomed = clip.fl(zoom_func)
+    if clip.mask is not None:
+        zoomed.mask = clip.mask.fl(get_zoom_func(clip.mask, scale_func, resampler))
+    return zoomed.set_duration(duration)
 
-def zoom_in(clip, duration, factor=1.3, smoothness=4):
-    def zoom(t):
-        progress = ease_in_out(t=t / duration, smoothness=smoothness)
-        scale = 1 + (factor - 1) * progress
-        new_w = clip.w * scale
-        new_h = clip.h * scale
-        x = (new_w - clip.w) / 2
-        y = (new_h - clip.h) / 2
-        return scale, x, y
 
-    zoomed = clip.fx(resize, lambda t: zoom(t)[0])
-    crop_func = get_crop_func(clip=clip, zoom_func=zoom)
+def zoom_in(clip, duration, factor=1.3, smoothness=4, resampler=None):
+    def scale(t):
+        progress = ease_in_out(t=t / duration, smoothness=smoothness)
+        return 1 + (factor - 1) * progress
 
-    return zoomed.fl(crop_func).set_duration(duration)
+    return zoom_clip(
+        clip=clip, duration=duration, scale_func=scale, resampler=resampler
+    )
 
 
-def zoom_out(clip, duration, factor=1.3, smoothness=4):
-    def zoom(t):
+def zoom_out(clip, duration, factor=1.3, smoothness=4, resampler=None):
+    def scale(t):
         progress = ease_in_out(t=t / duration, smoothness=smoothness)
-        scale = factor - (factor - 1) * progress
-        new_w = clip.w * scale
-        new_h = clip.h * scale
-        x = (new_w - clip.w) / 2
-        y = (new_h - clip.h) / 2
-        return scale, x, y
+        return factor - (factor - 1) * progress
 
-    zoomed = clip.fx(resize, lambda t: zoom(t)[0])
-    crop_func = get_crop_func(clip=clip, zoom_func=zoom)
+    return zoom_clip(
+        clip=clip, duration=duration, scale_func=scale, resampler=resampler
+    )
 
-    return zoomed.fl(crop_func).set_duration(duration)
 
-
-def zoom_in_out(clip, factor=1.3, duration=None, smoothness=4):
+def zoom_in_out(clip, factor=1.3, duration=None, smoothness=4, resampler=None):
     if duration is None:
         duration = clip.duration
 
-    def zoom(t):
+    def scale(t):
         half_duration = duration / 2
         if t <= half_duration:
             progress = ease_in_out(t=t / half_duration, smoothness=smoothness)
-            scale = 1 + (factor - 1) * progress
-        else:
-            progress = ease_in_out(
-                t=(t - half_duration) / half_duration, smoothness=smoothness
-            )
-            scale = factor - (factor - 1) * progress
-        new_w = clip.w * scale
-        new_h = clip.h * scale
-        x = (new_w - clip.w) / 2
-        y = (new_h - clip.h) / 2
-        return scale, x, y
-
-    zoomed = clip.fx(resize, lambda t: zoom(t)[0])
-    crop_func = get_crop_func(clip=clip, zoom_func=zoom)
-
-    return zoomed.fl(crop_func).set_duration(duration)
-
-
-def slide_in(clip, duration):
-    w, h = clip.size
-    direction = random.choice(list(Direction))
+            return 1 + (factor - 1) * progress
+        progress = ease_in_out(
+            t=(t - half_duration) / half_duration, smoothness=smoothness
+        )
+        return factor - (factor - 1) * progress
+
+    return zoom_clip(
+        clip=clip, duration=duration, scale_func=scale, resampler=resampler
+    )
+
+
+def animate_clip(
+    clip,
+    animation: Animation,
+    duration=None,
+    factor=1.3,
+    smoothness=4,
+    resampler: Resampler = None,
+):
+    if duration is None:
+        duration = clip.duration
 
-    if direction == Direction.LEFT:
-        slide_in_clip = clip.set_position(lambda t: (w * (-t / duration + 1), 0))
-    elif direction == Direction.RIGHT:
-        slide_in_clip = clip.set_position(lambda t: (-w * (-t / duration + 1), 0))
-    elif direction == Direction.TOP:
-        slide_in_clip = clip.set_position(lambda t: (0, h * (-t / duration + 1)))
-    elif direction == Direction.BOTTOM:
-        slide_in_clip = clip.set_position(lambda t: (0, -h * (-t / duration + 1)))
+    match animation:
+        case Animation.ZOOM:
+            animate = zoom_in_out
+        case Animation.ZOOMIN:
+            animate = zoom_in
+        case Animation.ZOOMOUT:
+            animate = zoom_out
+        case _:
+            return clip
 
-    return slide_in_clip.set_duration(duration)
+    return animate(
+        clip=clip,
+        duration=duration,
+        factor=factor,
+        smoothness=smoothness,
+        resampler=resampler,
+    )
 
 
-def slide_out(clip, duration):
-    w, h = clip.size
-    direction = random.choice(list(Direction))
+def get_slide_position_func(direction, size, duration, slide_out=False):
+    w, h = size
 
-    if direction == Direction.LEFT:
-        slide_out_clip = clip.set_position(lambda t: (-w * (t / duration), 0))
-    elif direction == Direction.RIGHT:
-        slide_out_clip = clip.set_position(lambda t: (w * (t / duration), 0))
-    elif direction == Direction.TOP:
-        slide_out_clip = clip.set_position(lambda t: (0, -h * (t / duration)))
-    elif direction == Direction.BOTTOM:
-        slide_out_clip = clip.set_position(lambda t: (0, h * (t / duration)))
+    def get_position(t):
+        # Offset from the resting position, as a fraction of the clip size.
+        offset = -t / duration if slide_out else 1 - t / duration
 
-    return slide_out_clip.set_duration(duration)
+        match direction:
+            case Direction.LEFT:
+                return (w * offset, 0)
+            case Direction.RIGHT:
+                return (-w * offset, 0)
+            case Direction.TOP:
+                return (0, h * offset)
+            case Direction.BOTTOM:
+                return (0, -h * offset)
 
+    return get_position
 
-def merge_two_clips(clip1, clip2):
-    return CompositeVideoClip([clip1.set_start(0), clip2.set_start(clip1.duration)])
 
+def slide_in(clip, duration, direction: Direction = None):
+    if direction is None:
+        direction = random.choice(list(Direction))
 
-def get_first_frame(clip):
-    return clip.get_frame(0)
+    position = get_slide_position_func(direction, clip.size, duration)
+    return clip.set_position(position).set_duration(duration)
 
 
-def get_last_frame(clip, initial_offset=0.01, step=0.01, max_attempts=10):
-    offset = clip.duration - initial_offset
+def slide_out(clip, duration, direction: Direction = None):
+    if direction is None:
+        direction = random.choice(list(Direction))
 
-    for attempt in range(max_attempts):
-        if offset < 0:
-            raise RuntimeError("Offset went below zero, unable to read the frame.")
+    position = get_slide_position_func(direction, clip.size, duration, slide_out=True)
+    return clip.set_position(position).set_duration(duration)
 
-        try:
-            frame = clip.get_frame(offset)
-            return frame
-        except Exception as e:
-            print(
-                f"Attempt {attempt + 1}: Failed to read frame at {offset:.3f} seconds. Error: {e}"
-            )
-            offset -= step
 
-    raise RuntimeError(f"Failed to read frame after {max_attempts} attempts.")
+def merge_two_clips(clip1, clip2):
+    return StaticAwareCompositeVideoClip(
+        [clip1.set_start(0), clip2.set_start(clip1.duration)]
+    )
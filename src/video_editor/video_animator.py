@@ -1,8 +1,18 @@
 import random
 from typing import List
-from moviepy.editor import ImageClip, VideoClip
-
-from .enums import Animation, EnterTransition, ExitTransition
+from moviepy.video.VideoClip import ImageClip, VideoClip
+
+from .content_hashes import hash_values
+from .enums import Animation, Direction, EnterTransition, ExitTransition, Resampling
+from .render_cache import RenderCache, get_animated_clip
+from .render_plan import (
+    AnimationPlan,
+    ClipPlan,
+    RenderPlan,
+    RenderPlanClip,
+    compile_render_plan,
+)
+from .resampling import Resampler, get_resampler
 from .video_animations import *
 
 __all__ = ["AutoVideoClipsAnimator"]
@@ -20,8 +30,23 @@ class AutoVideoClipsAnimator:
         exclude_exit_transitions: List[ExitTransition] = None,
         exclude_enter_transitions: List[EnterTransition] = None,
         exclude_animations: List[Animation] = None,
+        seed: int = None,
+        rng: random.Random = None,
+        animation_plan: AnimationPlan = None,
+        render_cache: RenderCache = None,
+        resampler: Resampler = None,
     ) -> None:
+        """
+        Choices are drawn from `rng`, or from a random.Random seeded with
+        `seed`, and from the global random module when neither is given.
+        A saved `animation_plan` is replayed instead of choosing again.
+        With a `render_cache`, animated clips and flattened timelines are
+        rendered once and read back from the cache afterwards. `resampler`
+        is used by the zoom animations.
+        """
         self.clips = clips
+        self.render_cache = render_cache
+        self.resampler = resampler or get_resampler(quality=Resampling.BILINEAR)
         self.transition_duration = transition_duration
         self.only_transitions = only_transitions
         self.zoom_factor = zoom_factor
@@ -31,26 +56,59 @@ class AutoVideoClipsAnimator:
         self.enter_transition = EnterTransition.NONE
         self.exit_transition = ExitTransition.NONE
 
+        if rng is None:
+            rng = random if seed is None else random.Random(seed)
+        self.rng = rng
+
+        self.animation_plan = animation_plan
+        if animation_plan is not None:
+            if len(animation_plan.clips) != len(clips):
+                raise ValueError(
+                    f"The animation plan has {len(animation_plan.clips)} clips, "
+                    f"got {len(clips)}."
+                )
+            self.animation = animation_plan.animation
+            self.transition_duration = animation_plan.transition_duration
+            self.zoom_factor = animation_plan.zoom_factor
+            self.zoom_smoothness = animation_plan.zoom_smoothness
+
         self.exit_transitions = [
             transition
             for transition in list(ExitTransition)
-            if transition not in exclude_exit_transitions
+            if transition not in (exclude_exit_transitions or [])
         ]
 
         self.enter_transitions = [
             transition
             for transition in list(EnterTransition)
-            if transition not in exclude_enter_transitions
+            if transition not in (exclude_enter_transitions or [])
         ]
 
         self.animations = [
             animation
             for animation in list(Animation)
-            if animation not in exclude_animations
+            if animation not in (exclude_animations or [])
         ]
 
-    def animate(self):
+    def plan(self) -> AnimationPlan:
         """
+        Returns the animation plan, deciding it on the first call.
+        """
+        if self.animation_plan is None:
+            self.animation_plan = AnimationPlan(
+                clips=self.plan_clips(),
+                animation=self.animation,
+                transition_duration=self.transition_duration,
+                zoom_factor=self.zoom_factor,
+                zoom_smoothness=self.zoom_smoothness,
+                source_clips=self.clips,
+            )
+        return self.animation_plan
+
+    def plan_clips(self) -> List[ClipPlan]:
+        """
+        Decides the animation and transitions of every clip and their
+        timings, returned in z-order (bottom first).
         - Zoom animations are added to the existent duration of each clip.
         - Fade transitions happen within the existent duration of each clip.
         - Slide transitions are added to the overall duration of each clip and
@@ -59,42 +117,115 @@ class AutoVideoClipsAnimator:
         first_clip = 0
         last_clip = len(self.clips) - 1
 
-        z_ordered_clips = []
+        clip_plans = []
         total_duration = 0
 
         for i, clip in enumerate(self.clips):
-
+            animation = Animation.NONE
             if not self.only_transitions:
-                clip = self.add_animation(clip)
+                animation = self.choose_animation()
 
+            enter_transition = EnterTransition.NONE
+            enter_direction = None
             if i > first_clip:
-                clip = self.add_enter_transition(clip)
+                enter_transition = self.choose_enter_transition()
+                if enter_transition == EnterTransition.SLIDEIN:
+                    enter_direction = self.rng.choice(list(Direction))
 
+            exit_transition = ExitTransition.NONE
+            exit_direction = None
             if i < last_clip:
-                clip = self.add_exit_transition(clip)
+                exit_transition = self.choose_exit_transition()
+                if exit_transition == ExitTransition.SLIDEOUT:
+                    exit_direction = self.rng.choice(list(Direction))
 
             offset = 0
-            if total_duration and self.enter_transition not in [EnterTransition.FADEIN]:
+            if total_duration and enter_transition not in [EnterTransition.FADEIN]:
                 offset = self.transition_duration
 
-            total_duration -= offset
-            clip = clip.set_start(total_duration)
-
-            total_duration += clip.duration
-
-            if self.enter_transition in [EnterTransition.SLIDEIN]:
-                z_ordered_clips.append(clip)
+            start = total_duration - offset
+            clip_start = start
+            if enter_transition == EnterTransition.SLIDEIN:
+                clip_start += self.transition_duration
+
+            total_duration = clip_start + clip.duration
+            if exit_transition == ExitTransition.SLIDEOUT:
+                total_duration += self.transition_duration
+
+            clip_plan = ClipPlan(
+                index=i,
+                start=start,
+                clip_start=clip_start,
+                end=total_duration,
+                animation=animation,
+                enter_transition=enter_transition,
+                exit_transition=exit_transition,
+                enter_direction=enter_direction,
+                exit_direction=exit_direction,
+            )
+
+            if enter_transition in [EnterTransition.SLIDEIN]:
+                clip_plans.append(clip_plan)
             else:
-                z_ordered_clips.insert(0, clip)
+                clip_plans.insert(0, clip_plan)
+
+        return clip_plans
 
+    def animate(self):
+        z_ordered_clips = [
+            self.build_clip(clip_plan) for clip_plan in self.plan().clips
+        ]
         return z_ordered_clips, self.animation
 
-    def add_animation(self, clip):
-        final_clip = clip
+    def compile(self) -> RenderPlan:
+        return compile_render_plan(
+            clip_plans=self.plan().clips,
+            clips=self.clips,
+            transition_duration=self.transition_duration,
+            zoom_factor=self.zoom_factor,
+            zoom_smoothness=self.zoom_smoothness,
+        )
 
-        if not self.enter_transitions:
+    def animate_flat(self):
+        """
+        Same timeline as animate(), rendered as a single RenderPlanClip.
+        """
+        clip = RenderPlanClip(
+            self.compile(),
+            self.clips,
+            render_cache=self.render_cache,
+            resampler=self.resampler,
+        )
+
+        if self.render_cache and clip.audio is None:
+            fingerprint = self.plan().fingerprint()
+            if fingerprint:
+                key = hash_values(
+                    fingerprint, self.resampler.key, self.render_cache.fps
+                )
+                clip = self.render_cache.get_clip(key, lambda: clip)
+
+        return clip, self.animation
+
+    def build_clip(self, clip_plan: ClipPlan):
+        animated_clip = self.add_animation(
+            self.clips[clip_plan.index], clip_plan.animation
+        )
+        clip = self.add_enter_transition(
+            animated_clip, clip_plan.enter_transition, clip_plan.enter_direction
+        )
+        clip = self.add_exit_transition(
+            clip,
+            clip_plan.exit_transition,
+            clip_plan.exit_direction,
+            source_clip=animated_clip,
+        )
+        return clip.set_start(clip_plan.start)
+
+    def choose_animation(self) -> Animation:
+        if not self.animations:
             self.animation = Animation.NONE
-            return final_clip
+            return self.animation
 
         match self.animation:
             case Animation.ZOOM:
@@ -106,41 +237,13 @@ class AutoVideoClipsAnimator:
             case Animation.NONE:
                 choices = self.animations
 
-        animation = random.choice(choices)
-
-        match animation:
-            case Animation.ZOOM:
-                final_clip = zoom_in_out(
-                    clip=clip,
-                    duration=clip.duration,
-                    factor=self.zoom_factor,
-                    smoothness=self.zoom_smoothness,
-                )
-            case Animation.ZOOMIN:
-                final_clip = zoom_in(
-                    clip=clip,
-                    duration=clip.duration,
-                    factor=self.zoom_factor,
-                    smoothness=self.zoom_smoothness,
-                )
-            case Animation.ZOOMOUT:
-                final_clip = zoom_out(
-                    clip=clip,
-                    duration=clip.duration,
-                    factor=self.zoom_factor,
-                    smoothness=self.zoom_smoothness,
-                )
-
-        self.animation = animation
-
-        return final_clip
-
-    def add_enter_transition(self, clip):
-        final_clip = clip
+        self.animation = self.rng.choice(choices)
+        return self.animation
 
+    def choose_enter_transition(self) -> EnterTransition:
         if not self.enter_transitions:
             self.enter_transition = EnterTransition.NONE
-            return final_clip
+            return self.enter_transition
 
         match self.exit_transition:
             case ExitTransition.FADEOUT:
@@ -150,41 +253,62 @@ class AutoVideoClipsAnimator:
             case ExitTransition.NONE:
                 transition = EnterTransition.SLIDEIN
 
+        self.enter_transition = transition
+        return transition
+
+    def choose_exit_transition(self) -> ExitTransition:
+        if not self.exit_transitions:
+            self.exit_transition = ExitTransition.NONE
+            return self.exit_transition
+
+        self.exit_transition = self.rng.choice(self.exit_transitions)
+        return self.exit_transition
+
+    def add_animation(self, clip, animation: Animation):
+        return get_animated_clip(
+            clip=clip,
+            animation=animation,
+            duration=clip.duration,
+            factor=self.zoom_factor,
+            smoothness=self.zoom_smoothness,
+            render_cache=self.render_cache,
+            resampler=self.resampler,
+        )
+
+    def add_enter_transition(
+        self, clip, transition: EnterTransition, direction: Direction = None
+    ):
         match transition:
             case EnterTransition.FADEIN:
-                final_clip = crossfadein(clip, self.transition_duration / 2)
+                return crossfadein(clip, self.transition_duration / 2)
             case EnterTransition.SLIDEIN:
                 frame = get_first_frame(clip=clip)
                 scaled_clip = ImageClip(frame)
-                slide_in_clip = slide_in(scaled_clip, self.transition_duration)
-                final_clip = merge_two_clips(slide_in_clip, clip)
-            case ExitTransition.NONE:
-                final_clip = clip
-
-        self.enter_transition = transition
-
-        return final_clip
-
-    def add_exit_transition(self, clip):
-        final_clip = clip
-
-        if not self.exit_transitions:
-            self.exit_transition = ExitTransition.NONE
-            return final_clip
-
-        transition = random.choice(self.exit_transitions)
+                slide_in_clip = slide_in(
+                    scaled_clip, self.transition_duration, direction=direction
+                )
+                return merge_two_clips(slide_in_clip, clip)
+        return clip
 
+    def add_exit_transition(
+        self,
+        clip,
+        transition: ExitTransition,
+        direction: Direction = None,
+        source_clip=None,
+    ):
+        """
+        `source_clip` is the clip before its enter transition, which ends on
+        the same frame and is read without compositing the transition.
+        """
         match transition:
             case ExitTransition.FADEOUT:
-                final_clip = crossfadeout(clip, self.transition_duration / 2)
+                return crossfadeout(clip, self.transition_duration / 2)
             case ExitTransition.SLIDEOUT:
-                frame = get_last_frame(clip=clip)
+                frame = get_last_frame(clip=source_clip or clip)
                 scaled_clip = ImageClip(frame)
-                slide_out_clip = slide_out(scaled_clip, self.transition_duration)
-                final_clip = merge_two_clips(clip, slide_out_clip)
-            case ExitTransition.NONE:
-                final_clip = clip
-
-        self.exit_transition = transition
-
-        return final_clip
+                slide_out_clip = slide_out(
+                    scaled_clip, self.transition_duration, direction=direction
+                )
+                return merge_two_clips(clip, slide_out_clip)
+        return clip
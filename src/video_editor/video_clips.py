@@ -1,18 +1,27 @@
-import multiprocessing
+import os
 from typing import List
-from moviepy.editor import (
-    ImageClip,
-    VideoClip,
-    VideoFileClip,
-    CompositeVideoClip,
-    TextClip,
-)
+from moviepy.video.VideoClip import ImageClip, VideoClip
+from moviepy.video.io.VideoFileClip import VideoFileClip
 
-from .video_animations import Animation, ExitTransition, EnterTransition
+from .audio_clips import set_audio_source
+from .burn_in import BurnIn
+from .content_hashes import get_file_content_hash, set_content_hash
+from .enums import Animation, ExitTransition, EnterTransition, OutputPreset
+from .frame_extraction import get_reader_lock, read_reader_frame, set_frame_reader
+from .instrumentation import LoggingSink, instrumented
+from .output_profiles import OutputProfile, get_output_profile
+from .render_cache import RenderCache
+from .render_plan import AnimationPlan
+from .resampling import Resampler
+from .slideshows import get_slideshow, write_slideshow
+from .static_frames import StaticAwareCompositeVideoClip
+from .subtitle_track import SubtitleTrack
 from .video_animator import AutoVideoClipsAnimator
-
-num_cores = multiprocessing.cpu_count()
-
+from .video_writers import (
+    write_video_frames,
+    write_video_pipelined,
+    write_video_segments,
+)
 
 __all__ = [
     "auto_animate_video_clips",
@@ -32,46 +41,162 @@ def auto_animate_video_clips(
     exclude_exit_transitions: List[ExitTransition] = None,
     exclude_enter_transitions: List[EnterTransition] = None,
     exclude_animations: List[Animation] = None,
+    flatten: bool = False,
+    seed: int = None,
+    animation_plan: AnimationPlan | str = None,
+    render_cache: RenderCache = None,
+    resampler: Resampler = None,
 ):
-    return AutoVideoClipsAnimator(
+    """
+    With `flatten`, the animated clips are returned as a single
+    RenderPlanClip that renders the whole timeline without nested
+    composites. `seed` makes the random choices reproducible.
+    `animation_plan` replays a plan, or the plan saved at that path; when
+    the path doesn't exist yet, the new plan is saved there. With a
+    `render_cache`, zoomed clips, and flattened timelines, are read back
+    from earlier renders of the same content. `resampler` is used by the
+    zoom animations, bilinear by default.
+    """
+    plan_path = None
+    if isinstance(animation_plan, str):
+        plan_path = animation_plan
+        animation_plan = None
+        if os.path.exists(plan_path):
+            animation_plan = AnimationPlan.load(plan_path)
+
+    animator = AutoVideoClipsAnimator(
         clips=clips,
         transition_duration=transition_duration,
-        animation=last_animation,
+        last_animation=last_animation,
         only_transitions=only_transitions,
         zoom_factor=zoom_factor,
         zoom_smoothness=zoom_smoothness,
         exclude_exit_transitions=exclude_exit_transitions,
         exclude_enter_transitions=exclude_enter_transitions,
         exclude_animations=exclude_animations,
-    ).animate()
+        seed=seed,
+        animation_plan=animation_plan,
+        render_cache=render_cache,
+        resampler=resampler,
+    )
+
+    if plan_path and animation_plan is None:
+        animator.plan().save(plan_path)
+
+    if flatten:
+        clip, animation = animator.animate_flat()
+        return [clip], animation
+    return animator.animate()
 
 
 def merge_video_clips(
-    clips: list, watermark_clip: ImageClip = None, subtitle_clips: List[TextClip] = None
+    clips: list,
+    watermark_clip: ImageClip = None,
+    subtitle_clips: List[VideoClip] | SubtitleTrack = None,
 ):
     if watermark_clip:
         clips = [*clips, watermark_clip]
 
+    final_clip = StaticAwareCompositeVideoClip(clips)
+
     if subtitle_clips:
-        clips = [*clips, *subtitle_clips]
+        if not isinstance(subtitle_clips, SubtitleTrack):
+            subtitle_clips = SubtitleTrack(subtitle_clips)
+        final_clip = subtitle_clips.apply_to(final_clip)
 
-    return CompositeVideoClip(clips)
+    return final_clip
 
 
 def extract_video_and_audio_clips(video_path: str):
     video_clip = VideoFileClip(video_path)
+    # Frames may be rendered by several threads, which mustn't move the
+    # reader's position under each other.
+    reader = video_clip.reader
+    get_reader_lock(reader)
+    video_clip.make_frame = lambda t: read_reader_frame(reader, t)
     audio_clip = video_clip.audio
     video_clip.audio = None
+    if audio_clip is not None:
+        set_audio_source(audio_clip, video_path)
+    set_content_hash(video_clip, get_file_content_hash(video_path))
+    set_frame_reader(video_clip, lambda: video_clip.reader)
     return video_clip, audio_clip
 
 
-def write_video(clip, output_path, max_duration=None):
+def write_video(
+    clip,
+    output_path,
+    max_duration=None,
+    output_profile: OutputProfile | OutputPreset = None,
+    workers: int = None,
+    segment_duration: float = None,
+    frame_workers: int = None,
+    queue_size: int = 8,
+    profile: bool = False,
+    ffmpeg_slideshows: bool = True,
+    burn_in: BurnIn = None,
+):
+    """
+    With `profile`, timers and counters are collected while writing, in
+    this process, then logged and returned as a report. Clips that only
+    show still images with cuts and fades are rendered by ffmpeg alone
+    (see write_slideshow()), unless `ffmpeg_slideshows` is False. The
+    subtitles and watermark of `burn_in` are drawn by ffmpeg while encoding.
+    """
+    if profile:
+        with instrumented(LoggingSink()) as instrumentation:
+            write_video(
+                clip,
+                output_path,
+                max_duration=max_duration,
+                output_profile=output_profile,
+                workers=workers,
+                segment_duration=segment_duration,
+                frame_workers=frame_workers,
+                queue_size=queue_size,
+                ffmpeg_slideshows=ffmpeg_slideshows,
+                burn_in=burn_in,
+            )
+        return instrumentation.last_report
+
+    if not isinstance(output_profile, OutputProfile):
+        output_profile = get_output_profile(output_profile)
+
+    slideshow = get_slideshow(clip) if ffmpeg_slideshows else None
+    if slideshow is not None:
+        write_slideshow(
+            slideshow,
+            output_path,
+            output_profile=output_profile,
+            max_duration=max_duration,
+            burn_in=burn_in,
+        )
+        return
+
     if max_duration and clip.duration > max_duration:
         clip = clip.subclip(0, max_duration)
-    clip.write_videofile(
-        output_path,
-        fps=30,
-        codec="libx264",
-        preset="ultrafast",
-        threads=num_cores,
-    )
+
+    clip = output_profile.prepare_clip(clip)
+
+    if workers and workers > 1:
+        write_video_segments(
+            clip=clip,
+            output_path=output_path,
+            profile=output_profile,
+            workers=workers,
+            segment_duration=segment_duration,
+            burn_in=burn_in,
+        )
+    elif frame_workers:
+        write_video_pipelined(
+            clip=clip,
+            output_path=output_path,
+            profile=output_profile,
+            frame_workers=frame_workers,
+            queue_size=queue_size,
+            burn_in=burn_in,
+        )
+    else:
+        write_video_frames(
+            clip=clip, output_path=output_path, profile=output_profile, burn_in=burn_in
+        )
@@ -0,0 +1,637 @@
+import os
+import re
+import math
+import queue
+import logging
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from time import perf_counter
+import numpy as np
+import proglog
+from moviepy.config import get_setting
+from moviepy.tools import find_extension
+
+from .audio_clips import get_audio_source, iter_audio_samples
+from .burn_in import BurnIn
+from .instrumentation import count, timer
+from .output_profiles import OutputProfile
+
+__all__ = [
+    "AudioInput",
+    "AudioStream",
+    "FFmpegPipeWriter",
+    "PipelineStats",
+    "write_video_frames",
+    "write_video_pipelined",
+    "write_video_segments",
+]
+
+logger = logging.getLogger(__name__)
+
+num_cores = multiprocessing.cpu_count()
+
+# Clip rendered by worker processes. It is set before the pool forks, so
+# workers inherit it instead of pickling clips built from lambdas.
+_worker_clip = None
+
+
+def can_fork():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+class FFmpegPipeWriter:
+    """
+    Pipes raw RGB frames to an ffmpeg process encoding with the given
+    output profile. Frame buffers are handed to the pipe without copying
+    them into a bytes object first. The `audio` input, or an `audiofile`
+    copied as is, is muxed with the frames. A `filter_script` file holds a
+    filtergraph applied to the frames before they are encoded.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size,
+        profile: OutputProfile,
+        audiofile: str = None,
+        threads: int = None,
+        filter_script: str = None,
+        audio: "AudioInput" = None,
+    ) -> None:
+        self.path = path
+        cmd = [
+            get_setting("FFMPEG_BINARY"),
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-vcodec",
+            "rawvideo",
+            "-s",
+            "%dx%d" % tuple(size),
+            "-pix_fmt",
+            "rgb24",
+            "-r",
+            "%.02f" % profile.fps,
+            "-an",
+            "-i",
+            "-",
+        ]
+        if audiofile is not None:
+            audio = AudioInput(["-i", audiofile], ["-acodec", "copy"])
+        if audio is not None:
+            cmd += audio.get_args(input_index=1)
+        if filter_script is not None:
+            cmd += ["-filter_script:v", filter_script]
+        cmd += profile.get_video_args(size=size, threads=threads)
+        cmd.append(path)
+
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+    def get_error(self, reason):
+        self.proc.stdin.close()
+        stderr = self.proc.stderr.read().decode(errors="replace").strip()
+        self.proc.wait()
+        return IOError(f"ffmpeg {reason} while writing {self.path}: {stderr}")
+
+    def write_frame(self, frame: np.ndarray):
+        try:
+            with timer("writer.write_frame"):
+                self.proc.stdin.write(memoryview(np.ascontiguousarray(frame)))
+        except (BrokenPipeError, OSError) as e:
+            raise self.get_error("stopped accepting frames") from e
+
+    def close(self):
+        if self.proc is None:
+            return
+
+        proc, self.proc = self.proc, None
+        proc.stdin.close()
+        stderr = proc.stderr.read().decode(errors="replace").strip()
+        proc.stderr.close()
+        if proc.wait() != 0:
+            raise IOError(
+                f"ffmpeg failed with exit code {proc.returncode} while writing "
+                f"{self.path}: {stderr}"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+
+
+@dataclass
+class PipelineStats:
+    frames: int = 0
+    wall_time: float = 0
+    render_time: float = 0
+    order_wait_time: float = 0
+    write_time: float = 0
+    frame_workers: int = 1
+
+    def report(self) -> dict:
+        def rate(time):
+            return self.frames / time if time else float("inf")
+
+        return {
+            "frames": self.frames,
+            "fps": rate(self.wall_time),
+            "render_fps_per_worker": rate(self.render_time),
+            "render_fps": rate(self.render_time) * self.frame_workers,
+            "order_wait_time": self.order_wait_time,
+            "write_fps": rate(self.write_time),
+        }
+
+
+def get_num_frames(clip, fps):
+    # Frames are shown from i / fps, as in iter_frames(), so a partial
+    # frame at the end is written too.
+    return max(0, math.ceil(clip.duration * fps - 1e-6))
+
+
+def get_segment_frames(num_frames: int, fps: float, workers: int, segment_duration):
+    if segment_duration:
+        frames_per_segment = max(1, round(segment_duration * fps))
+    else:
+        frames_per_segment = max(1, -(-num_frames // workers))
+
+    return [
+        (first, min(first + frames_per_segment, num_frames))
+        for first in range(0, num_frames, frames_per_segment)
+    ]
+
+
+def render_frame(clip, t):
+    start = perf_counter()
+    with timer("frame.render"):
+        frame = clip.get_frame(t)
+    if frame.dtype != "uint8":
+        frame = frame.astype("uint8")
+    return np.ascontiguousarray(frame), perf_counter() - start
+
+
+def _render_worker_frame(t):
+    return render_frame(_worker_clip, t)
+
+
+def write_frames(clip, path, profile, first_frame, last_frame, **writer_params):
+    with FFmpegPipeWriter(path, clip.size, profile, **writer_params) as writer:
+        for frame_index in range(first_frame, last_frame):
+            frame, _ = render_frame(clip, frame_index / profile.fps)
+            writer.write_frame(frame)
+
+
+def _write_segment(task):
+    path, profile, first_frame, last_frame, writer_params = task
+    write_frames(_worker_clip, path, profile, first_frame, last_frame, **writer_params)
+    return path
+
+
+def write_temp_audio(clip, tmp_dir, profile):
+    if clip.audio is None:
+        return None
+
+    audio_ext = find_extension(profile.audio_codec)
+    audio_path = os.path.join(tmp_dir, f"audio.{audio_ext}")
+    clip.audio.write_audiofile(
+        audio_path,
+        fps=profile.audio_fps,
+        nbytes=4,
+        codec=profile.audio_codec,
+        bitrate=profile.audio_bitrate,
+        logger=None,
+    )
+    return audio_path
+
+
+def get_audio_codec_args(profile: OutputProfile) -> list:
+    args = ["-acodec", profile.audio_codec, "-ar", str(profile.audio_fps)]
+    if profile.audio_bitrate:
+        args += ["-b:a", profile.audio_bitrate]
+    return args
+
+
+@lru_cache(maxsize=64)
+def probe_audio(path: str):
+    """
+    (codec, sample rate, channel layout) of the first audio stream of a
+    media file, as reported by ffmpeg, or None without one.
+    """
+    process = subprocess.run(
+        [get_setting("FFMPEG_BINARY"), "-hide_banner", "-i", path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    match = re.search(
+        r"Stream #.*?: Audio: (\w+).*?, (\d+) Hz, ([\w.()]+)",
+        process.stderr.decode(errors="replace"),
+    )
+    if match is None:
+        return None
+    return match[1], int(match[2]), match[3]
+
+
+def can_copy_audio(path: str, profile: OutputProfile) -> bool:
+    # Copied streams must be what the profile would have encoded: same
+    # codec and sample rate, and stereo like the decoded clips.
+    codec = {
+        "libmp3lame": "mp3",
+        "libfdk_aac": "aac",
+        "libvorbis": "vorbis",
+        "libopus": "opus",
+    }.get(profile.audio_codec, profile.audio_codec)
+    return probe_audio(path) == (codec, profile.audio_fps, "stereo")
+
+
+class AudioInput:
+    """
+    Audio muxed by an ffmpeg command as its input number `input_index`:
+    the `input_args` reading it and the `codec_args` encoding or copying it.
+    """
+
+    def __init__(self, input_args: list, codec_args: list) -> None:
+        self.input_args = input_args
+        self.codec_args = codec_args
+
+    def get_args(self, input_index: int) -> list:
+        # Audio comes from its own input even when it is a video file.
+        return [
+            *self.input_args,
+            "-map",
+            "0:v",
+            "-map",
+            f"{input_index}:a:0",
+            *self.codec_args,
+        ]
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class AudioStream(AudioInput):
+    """
+    Samples of an audio clip streamed to ffmpeg as raw float32 through a
+    FIFO, by a thread writing them while ffmpeg encodes the frames, rather
+    than encoded to a temporary file before the video.
+    """
+
+    def __init__(self, clip, path: str, profile: OutputProfile) -> None:
+        super().__init__(
+            [
+                "-f",
+                "f32le",
+                "-ar",
+                str(profile.audio_fps),
+                "-ac",
+                "2",
+                "-i",
+                path,
+            ],
+            get_audio_codec_args(profile),
+        )
+        self.clip = clip
+        self.path = path
+        self.fps = profile.audio_fps
+        self.error = None
+        self.thread = None
+
+    def feed(self):
+        try:
+            # Opening blocks until ffmpeg opens the FIFO for reading.
+            with open(self.path, "wb", buffering=0) as f:
+                for chunk in iter_audio_samples(self.clip, self.fps):
+                    # Clipped like the integer samples moviepy writes.
+                    chunk = np.clip(chunk, -1, 1)
+                    with timer("writer.write_audio"):
+                        f.write(memoryview(chunk))
+        except BrokenPipeError:
+            # ffmpeg stopped reading, e.g. past the output duration. Its own
+            # errors are reported by the command.
+            pass
+        except BaseException as e:
+            self.error = e
+
+    def start(self):
+        os.mkfifo(self.path)
+        self.thread = threading.Thread(target=self.feed, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # Unblocks the thread if ffmpeg never opened the FIFO: its open()
+        # returns and its writes fail once this end is closed.
+        try:
+            os.close(os.open(self.path, os.O_RDONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
+        self.thread.join()
+
+    def close(self):
+        self.stop()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        self.stop()
+
+
+def get_audio_input(clip, tmp_dir, profile: OutputProfile) -> AudioInput:
+    """
+    Audio of the clip for the ffmpeg writer: the encoded source copied as
+    is when the clip plays it unchanged and the profile would encode it
+    the same way, otherwise the samples streamed through a FIFO, or a
+    temporary file where FIFOs aren't available.
+    """
+    if clip.audio is None:
+        return None
+
+    source = get_audio_source(clip.audio)
+    if source is not None and can_copy_audio(source, profile):
+        count("audio.copied")
+        return AudioInput(["-i", source], ["-acodec", "copy"])
+
+    if not hasattr(os, "mkfifo"):
+        audio_path = write_temp_audio(clip, tmp_dir, profile)
+        return AudioInput(["-i", audio_path], ["-acodec", "copy"])
+    return AudioStream(clip.audio, os.path.join(tmp_dir, "audio.fifo"), profile)
+
+
+@contextmanager
+def open_audio_input(clip, tmp_dir, profile: OutputProfile):
+    audio = get_audio_input(clip, tmp_dir, profile)
+    if audio is None:
+        yield None
+        return
+
+    audio.start()
+    try:
+        yield audio
+    except BaseException:
+        audio.abort()
+        raise
+    audio.close()
+
+
+def write_burn_in_filters(burn_in: BurnIn, clip, tmp_dir, profile, first_frame=0):
+    if burn_in is None:
+        return None
+    return burn_in.write_filter_script(
+        os.path.join(tmp_dir, f"burn_in_{first_frame:07d}.txt"),
+        clip.size,
+        profile.fps,
+        start_time=first_frame / profile.fps,
+    )
+
+
+def get_temp_dir(output_path):
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    return tempfile.TemporaryDirectory(dir=output_dir)
+
+
+def write_video_frames(
+    clip, output_path: str, profile: OutputProfile, burn_in: BurnIn = None
+):
+    """
+    Serial writer: renders every frame at t = frame_index / fps on the
+    calling thread, with a progress bar.
+    """
+    with get_temp_dir(output_path) as tmp_dir, open_audio_input(
+        clip, tmp_dir, profile
+    ) as audio:
+        threads = profile.threads or num_cores
+
+        with FFmpegPipeWriter(
+            output_path,
+            clip.size,
+            profile,
+            audio=audio,
+            threads=threads,
+            filter_script=write_burn_in_filters(burn_in, clip, tmp_dir, profile),
+        ) as writer:
+            # Frames are rendered at the times the other writers use, rather
+            # than iter_frames()'s np.arange(), which rounds differently.
+            progress_bar = proglog.default_bar_logger("bar")
+            num_frames = get_num_frames(clip, profile.fps)
+            for frame_index in progress_bar.iter_bar(t=range(num_frames)):
+                frame, _ = render_frame(clip, frame_index / profile.fps)
+                writer.write_frame(frame)
+
+
+def write_frames_pipelined(
+    clip,
+    path: str,
+    profile: OutputProfile,
+    frame_workers: int = 2,
+    queue_size: int = 8,
+    use_processes: bool = False,
+    **writer_params,
+) -> PipelineStats:
+    """
+    Overlaps frame generation with encoding. Up to `queue_size` upcoming
+    frames are rendered by a pool of `frame_workers`, collected in order and
+    handed to a writer thread through a bounded queue, so at most about
+    2 * `queue_size` frames are held in memory at any time. Worker threads
+    share the clip, so clips decoded by ffmpeg must read their frames with
+    read_reader_frame(), as extracted and cached clips do.
+    """
+    global _worker_clip
+
+    num_frames = get_num_frames(clip, profile.fps)
+    stats = PipelineStats(frames=num_frames, frame_workers=frame_workers)
+    frames_queue = queue.Queue(maxsize=queue_size)
+    errors = []
+
+    def write_loop(writer):
+        try:
+            while (frame := frames_queue.get()) is not None:
+                start = perf_counter()
+                writer.write_frame(frame)
+                stats.write_time += perf_counter() - start
+        except BaseException as e:
+            errors.append(e)
+            while frames_queue.get() is not None:
+                pass
+
+    if use_processes and can_fork():
+        _worker_clip = clip
+        executor = ProcessPoolExecutor(
+            max_workers=frame_workers,
+            mp_context=multiprocessing.get_context("fork"),
+        )
+        render = _render_worker_frame
+    else:
+        executor = ThreadPoolExecutor(max_workers=frame_workers)
+        render = lambda t: render_frame(clip, t)
+
+    start = perf_counter()
+    with FFmpegPipeWriter(path, clip.size, profile, **writer_params) as writer:
+        writer_thread = threading.Thread(target=write_loop, args=(writer,))
+        writer_thread.start()
+
+        pending = deque()
+        next_frame = 0
+        try:
+            for _ in range(num_frames):
+                while next_frame < num_frames and len(pending) < queue_size:
+                    pending.append(executor.submit(render, next_frame / profile.fps))
+                    next_frame += 1
+
+                wait_start = perf_counter()
+                frame, render_time = pending.popleft().result()
+                stats.order_wait_time += perf_counter() - wait_start
+                stats.render_time += render_time
+
+                if errors:
+                    break
+                frames_queue.put(frame)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            _worker_clip = None
+            frames_queue.put(None)
+            writer_thread.join()
+
+        if errors:
+            raise errors[0]
+
+    stats.wall_time = perf_counter() - start
+    logger.info("Pipelined write of %s: %s", path, stats.report())
+    return stats
+
+
+def write_video_pipelined(
+    clip,
+    output_path: str,
+    profile: OutputProfile,
+    frame_workers: int = 2,
+    queue_size: int = 8,
+    use_processes: bool = False,
+    burn_in: BurnIn = None,
+) -> PipelineStats:
+    with get_temp_dir(output_path) as tmp_dir, open_audio_input(
+        clip, tmp_dir, profile
+    ) as audio:
+        return write_frames_pipelined(
+            clip,
+            output_path,
+            profile,
+            frame_workers=frame_workers,
+            queue_size=queue_size,
+            use_processes=use_processes,
+            audio=audio,
+            threads=profile.threads or num_cores,
+            filter_script=write_burn_in_filters(burn_in, clip, tmp_dir, profile),
+        )
+
+
+def run_ffmpeg(args):
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", *args]
+    process = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg failed with exit code {process.returncode}: "
+            f"{process.stderr.decode(errors='replace').strip()}"
+        )
+
+
+def concat_segments(segment_paths, output_path, audio: AudioInput = None):
+    if not segment_paths:
+        raise ValueError("No segments to join.")
+    list_path = f"{os.path.splitext(segment_paths[0])[0]}_list.txt"
+    with open(list_path, "w") as f:
+        for path in segment_paths:
+            escaped_path = os.path.abspath(path).replace("'", r"'\''")
+            f.write(f"file '{escaped_path}'\n")
+
+    args = ["-f", "concat", "-safe", "0", "-i", list_path]
+    if audio is not None:
+        args += audio.get_args(input_index=1)
+    run_ffmpeg([*args, "-c:v", "copy", output_path])
+
+
+def write_video_segments(
+    clip,
+    output_path: str,
+    profile: OutputProfile,
+    workers: int,
+    segment_duration: float = None,
+    burn_in: BurnIn = None,
+):
+    """
+    Renders the clip as independent time segments in a process pool, each
+    with its own ffmpeg writer, then joins them without re-encoding using
+    ffmpeg's concat demuxer. Every segment receives the same frames as the
+    serial writer, at t = frame_index / fps, and burns in the overlays of
+    its own time span.
+    """
+    global _worker_clip
+
+    segments = get_segment_frames(
+        num_frames=max(1, get_num_frames(clip, profile.fps)),
+        fps=profile.fps,
+        workers=workers,
+        segment_duration=segment_duration,
+    )
+    writer_params = dict(threads=max(1, (profile.threads or num_cores) // workers))
+    ext = os.path.splitext(output_path)[1]
+
+    with get_temp_dir(output_path) as tmp_dir:
+        tasks = [
+            (
+                os.path.join(tmp_dir, f"segment_{i:05d}{ext}"),
+                profile,
+                first_frame,
+                last_frame,
+                dict(
+                    writer_params,
+                    filter_script=write_burn_in_filters(
+                        burn_in, clip, tmp_dir, profile, first_frame
+                    ),
+                ),
+            )
+            for i, (first_frame, last_frame) in enumerate(segments)
+        ]
+
+        if can_fork():
+            _worker_clip = clip
+            try:
+                context = multiprocessing.get_context("fork")
+                with context.Pool(processes=min(workers, len(tasks))) as pool:
+                    segment_paths = pool.map(_write_segment, tasks, chunksize=1)
+            finally:
+                _worker_clip = None
+        else:
+            segment_paths = []
+            for path, _, first_frame, last_frame, task_params in tasks:
+                write_frames(
+                    clip, path, profile, first_frame, last_frame, **task_params
+                )
+                segment_paths.append(path)
+
+        # The audio is encoded while the segments are joined.
+        with open_audio_input(clip, tmp_dir, profile) as audio:
+            concat_segments(segment_paths, output_path, audio=audio)